@@ -0,0 +1,4 @@
+from resources.lib.background_service import BackgroundService
+
+
+BackgroundService().run()
@@ -0,0 +1,189 @@
+import json
+import sqlite3
+import threading
+
+import xbmc
+
+from resources.lib import metrics
+from resources.lib.broker import BrokerServer
+from resources.lib.data_collector import _jsonrpc, invalidate_show_ids
+from resources.lib.exceptions import ConfigurationError, ProviderError, TooManyRequests
+from resources.lib.hash_indexer import LibraryHashIndexer
+from resources.lib.library_index import get_library_index
+from resources.lib.playlist_prefetcher import PlaylistPrefetcher
+from resources.lib.subtitle_downloader import build_query
+from resources.lib.utilities import log, __addon__
+
+INDEXER_START_DELAY = 120
+VIDEO_PLAYER = 1
+
+
+def get_preferred_language(setting):
+    """Resolves Kodi's preferred subtitle language setting to the language the subtitle dialog passes.
+
+    Like the dialog, "original" becomes the language of the playing audio stream and "default" the
+    language of Kodi's interface, both as English names."""
+    if setting.lower() == "original":
+        player = _jsonrpc("Player.GetProperties", {"playerid": VIDEO_PLAYER, "properties": ["currentaudiostream"]},
+                          use_cache=False) or {}
+        audio_language = (player.get("currentaudiostream") or {}).get("language") or ""
+        return (xbmc.convertLanguage(audio_language, xbmc.ENGLISH_NAME) if audio_language else "") or "Unknown"
+    if setting.lower() == "default":
+        return xbmc.getLanguage(xbmc.ENGLISH_NAME)
+    return xbmc.convertLanguage(setting, xbmc.ENGLISH_NAME) or setting
+
+
+def get_subtitle_language_params():
+    """Builds the language params Kodi passes to the subtitle dialog from Kodi's settings."""
+    languages = (_jsonrpc("Settings.GetSettingValue", {"setting": "subtitles.languages"}) or {}).get("value") or []
+    preferred_language = (_jsonrpc("Settings.GetSettingValue",
+                                   {"setting": "locale.subtitlelanguage"}) or {}).get("value") or ""
+    params = {"languages": ",".join(languages)}
+    if preferred_language:
+        params["preferredlanguage"] = get_preferred_language(preferred_language)
+    return params
+
+
+class PlayerMonitor(xbmc.Player):
+
+    def __init__(self, on_av_started):
+        super().__init__()
+        self._on_av_started = on_av_started
+
+    def onAVStarted(self):
+        self._on_av_started()
+
+
+class BackgroundService(xbmc.Monitor):
+    """Resident part of the add-on, prepares subtitle searches while the user watches."""
+
+    def __init__(self):
+        super().__init__()
+        self.player = PlayerMonitor(self.on_av_started)
+        self.hash_indexer = LibraryHashIndexer(self, self.player, __addon__.getSettingInt("library_hash_rate") * 1024,
+                                               __addon__.getSettingBool("library_hash_index"))
+        self._library_index_thread = None
+        self.playlist_prefetcher = PlaylistPrefetcher(self, self.player, self.prewarm_search)
+        self.broker = None
+
+    def run(self):
+        log(__name__, "background service started")
+        self.start_broker()
+        # plugin invocations only fall back to a bounded lookup until the index exists, build it right away
+        self.build_library_index()
+        # give Kodi's own startup a head start before hashing the library
+        if not self.waitForAbort(INDEXER_START_DELAY):
+            self.start_hash_indexer()
+        while not self.abortRequested():
+            self.build_library_index()
+            if self.waitForAbort(60):
+                break
+            metrics.flush()
+        if self.broker:
+            self.broker.stop()
+        metrics.flush()
+        log(__name__, "background service stopped")
+
+    def onSettingsChanged(self):
+        was_enabled = self.hash_indexer.enabled
+        self.hash_indexer.configure(__addon__.getSettingBool("library_hash_index"),
+                                    __addon__.getSettingInt("library_hash_rate") * 1024)
+        if self.hash_indexer.enabled and not was_enabled:
+            self.start_hash_indexer()
+
+    def onNotification(self, sender, method, data):
+        if method == "VideoLibrary.OnScanFinished":
+            self.start_hash_indexer()
+        elif method in ("VideoLibrary.OnUpdate", "VideoLibrary.OnRemove"):
+            self.on_library_change(method, data)
+
+    def start_broker(self):
+        try:
+            self.broker = BrokerServer()
+            self.broker.start()
+        except OSError as e:
+            log(__name__, f"broker unavailable, plugin invocations will call the API themselves: {e}")
+            self.broker = None
+
+    def start_hash_indexer(self):
+        self.hash_indexer.start()
+
+    def build_library_index(self):
+        """Rebuilds the library index in a background thread when it is missing or outdated."""
+        library_index = get_library_index()
+        if not library_index or library_index.is_current():
+            return
+        if self._library_index_thread and self._library_index_thread.is_alive():
+            return
+
+        def build():
+            try:
+                library_index.rebuild()
+            except sqlite3.Error as e:
+                log(__name__, f"library index build failed: {e}")
+
+        self._library_index_thread = threading.Thread(target=build, name="library_index")
+        self._library_index_thread.start()
+
+    def on_library_change(self, method, data):
+        try:
+            data = json.loads(data)
+            # OnUpdate nests the changed item, OnRemove doesn't
+            item = data.get("item", data)
+        except (AttributeError, ValueError) as e:
+            log(__name__, f"unexpected {method} data: {e}")
+            return
+        # episode updates, e.g. of the play count, leave the shows' IDs as they are
+        if item.get("type") == "tvshow":
+            invalidate_show_ids()
+        self.update_library_index(method, item)
+
+    def update_library_index(self, method, item):
+        """Applies a single library change to the library index."""
+        library_index = get_library_index()
+        if not library_index or not library_index.is_built():
+            return
+        try:
+            if method == "VideoLibrary.OnUpdate":
+                library_index.update(item.get("type"), item.get("id"))
+            else:
+                library_index.remove(item.get("type"), item.get("id"))
+        except sqlite3.Error as e:
+            log(__name__, f"library index update failed: {e}")
+
+    def on_av_started(self):
+        if not self.player.isPlayingVideo():
+            return
+        if __addon__.getSettingBool("prewarm_search"):
+            threading.Thread(target=self.prewarm_search, name="prewarm_search").start()
+        if __addon__.getSettingBool("prefetch_playlist"):
+            self.playlist_prefetcher.start(__addon__.getSettingInt("prefetch_playlist_items"))
+
+    def prewarm_search(self, context=None):
+        """Runs the search of the subtitle dialog for the playing item, or the item of context, so
+        opening the dialog is served from the search cache. Returns False when rate limited."""
+        if int(float(__addon__.getSetting("search_cache_duration") or 0)) <= 0:
+            log(__name__, "search cache disabled, nothing to prewarm")
+            return
+
+        try:
+            query = build_query(get_subtitle_language_params(), context=context)
+            if self.abortRequested() or not query.get("languages"):
+                return
+            credentials = __addon__.getSetting("APIKey"), __addon__.getSetting("OSuser"), __addon__.getSetting("OSpass")
+            if self.broker:
+                # warms the session and caches plugin invocations use through the broker
+                open_subtitles = self.broker.get_provider(*credentials)
+            else:
+                from resources.lib.os.provider import OpenSubtitlesProvider
+
+                open_subtitles = OpenSubtitlesProvider(*credentials)
+            subtitles = open_subtitles.search_subtitles(query)
+            log(__name__, f"prewarmed search with {len(subtitles) if subtitles else 0} subtitles")
+        except TooManyRequests as e:
+            log(__name__, f"prewarm search rate limited: {e}")
+            return False
+        except (ConfigurationError, ProviderError, ValueError) as e:
+            log(__name__, f"prewarm search failed: {e}")
+        except Exception as e:
+            log(__name__, f"prewarm search failed unexpectedly: {e}")
@@ -0,0 +1,181 @@
+import base64
+import hmac
+import json
+import secrets
+import socket
+import socketserver
+import threading
+
+import xbmcgui
+
+from resources.lib import metrics
+from resources.lib.exceptions import AuthenticationError, BadUsernameError, ConfigurationError, \
+    DownloadLimitExceeded, ProviderError, ServiceUnavailable, TooManyRequests
+from resources.lib.utilities import log
+
+# "port:secret" of the running broker, on the home window so every plugin invocation can read it
+BROKER_PROPERTY = "opensubtitles.broker"
+BROKER_HOST = "127.0.0.1"
+CONNECT_TIMEOUT = 1
+# longer than a download, which is two API requests of up to 30s each
+CALL_TIMEOUT = 90
+# a client that connects must send its request line within this time
+REQUEST_TIMEOUT = 5
+BROKER_METHODS = ("search_subtitles", "download_subtitle")
+ERRORS = {error.__name__: error for error in (AuthenticationError, BadUsernameError, ConfigurationError,
+                                              DownloadLimitExceeded, ProviderError, ServiceUnavailable,
+                                              TooManyRequests, ValueError)}
+
+
+class BrokerUnavailable(Exception):
+    """Raised by call_broker when no broker took the request, so it is safe to run it elsewhere."""
+    pass
+
+
+def _encode(method, result):
+    if method == "download_subtitle" and result and isinstance(result.get("content"), bytes):
+        result = {**result, "content": base64.b64encode(result["content"]).decode("ascii")}
+    return result
+
+
+def _decode(method, result):
+    if method == "download_subtitle" and result and isinstance(result.get("content"), str):
+        result["content"] = base64.b64decode(result["content"])
+    return result
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    """Serves one newline delimited JSON request per connection."""
+
+    def handle(self):
+        self.connection.settimeout(REQUEST_TIMEOUT)
+        try:
+            request = json.loads(self.rfile.readline().decode("utf-8"))
+        except OSError as e:
+            log(__name__, f"no broker request received: {e}")
+            return
+        except ValueError:
+            return
+        if not hmac.compare_digest(str(request.get("secret", "")), self.server.secret):
+            log(__name__, "rejected broker request with a wrong secret")
+            self.wfile.write(b'{"rejected": true}\n')
+            return
+        method = request.get("method")
+        try:
+            if method not in BROKER_METHODS:
+                raise ValueError(f"Unknown broker method {method}")
+            provider = self.server.get_provider(**request["credentials"])
+            response = {"result": _encode(method, getattr(provider, method)(request["query"]))}
+        except tuple(ERRORS.values()) as e:
+            response = {"error": type(e).__name__, "message": str(e)}
+        except Exception as e:
+            log(__name__, f"broker {method} failed unexpectedly: {e!r}")
+            response = {"error": "ProviderError", "message": str(e)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class BrokerServer(socketserver.ThreadingTCPServer):
+    """Answers provider calls of plugin invocations from the background service.
+
+    Its providers, with their keep-alive HTTP sessions and in-memory caches, live as long as
+    the service, so plugin invocations skip connection setup to the API and its download CDN."""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__((BROKER_HOST, 0), BrokerHandler)
+        self.secret = secrets.token_hex(16)
+        self._providers = {}
+        self._providers_lock = threading.Lock()
+        self._thread = None
+
+    def get_provider(self, api_key, username, password):
+        """Returns the provider of a set of credentials, created on first use."""
+        from resources.lib.os.provider import OpenSubtitlesProvider
+
+        with self._providers_lock:
+            key = (api_key, username, password)
+            if key not in self._providers:
+                self._providers[key] = OpenSubtitlesProvider(api_key, username, password)
+            return self._providers[key]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="broker")
+        self._thread.daemon = True
+        self._thread.start()
+        xbmcgui.Window(10000).setProperty(BROKER_PROPERTY, f"{self.server_address[1]}:{self.secret}")
+        log(__name__, f"broker listening on port {self.server_address[1]}")
+
+    def stop(self):
+        xbmcgui.Window(10000).clearProperty(BROKER_PROPERTY)
+        self.shutdown()
+        self.server_close()
+        log(__name__, "broker stopped")
+
+
+def call_broker(method, credentials, query):
+    """Runs a provider method in the broker and returns its result, raising the provider's errors."""
+    address = xbmcgui.Window(10000).getProperty(BROKER_PROPERTY)
+    if not address:
+        raise BrokerUnavailable("broker not running")
+    port, secret = address.split(":", 1)
+    try:
+        connection = socket.create_connection((BROKER_HOST, int(port)), timeout=CONNECT_TIMEOUT)
+    except OSError as e:
+        raise BrokerUnavailable(f"broker not reachable: {e}")
+
+    with connection:
+        connection.settimeout(CALL_TIMEOUT)
+        try:
+            connection.sendall(json.dumps({"secret": secret, "method": method, "credentials": credentials,
+                                           "query": query}).encode("utf-8") + b"\n")
+        except OSError as e:
+            raise BrokerUnavailable(f"broker not reachable: {e}")
+        try:
+            with connection.makefile("rb") as response_file:
+                response = json.loads(response_file.readline().decode("utf-8"))
+        except (OSError, ValueError) as e:
+            raise ServiceUnavailable(f"No answer from broker: {e}")
+
+    # the secret belongs to a broker that is gone, nothing ran
+    if response.get("rejected"):
+        raise BrokerUnavailable("broker rejected the request")
+    if "error" in response:
+        raise ERRORS.get(response["error"], ProviderError)(response.get("message", ""))
+    return _decode(method, response["result"])
+
+
+class BrokeredProvider(object):
+    """Stands in for OpenSubtitlesProvider in plugin invocations.
+
+    Calls go to the broker of the background service. When the broker is not running they go to
+    an OpenSubtitlesProvider in this process, which is only imported and created then."""
+
+    def __init__(self, api_key, username, password):
+        if not api_key:
+            raise ConfigurationError("Api_key must be specified")
+        self.credentials = {"api_key": api_key, "username": username, "password": password}
+        self._provider = None
+
+    @property
+    def provider(self):
+        if self._provider is None:
+            from resources.lib.os.provider import OpenSubtitlesProvider
+
+            self._provider = OpenSubtitlesProvider(**self.credentials)
+        return self._provider
+
+    def search_subtitles(self, query):
+        return self._call("search_subtitles", query)
+
+    def download_subtitle(self, query):
+        return self._call("download_subtitle", query)
+
+    def _call(self, method, query):
+        try:
+            with metrics.timed(f"broker.{method}"):
+                return call_broker(method, self.credentials, query)
+        except BrokerUnavailable as e:
+            log(__name__, f"{e}, calling {method} in process")
+            metrics.increment("broker.fallbacks")
+        return getattr(self.provider, method)(query)
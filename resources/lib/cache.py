@@ -1,20 +1,41 @@
 import json
+import sqlite3
+import threading
+import zlib
 
+from collections import OrderedDict
 from time import time
 
-import xbmcgui
-
+from resources.lib import metrics
+from resources.lib.storage import open_database
 from resources.lib.utilities import log
 
+CACHE_DATABASE = "cache.db"
+# total size of the compressed values kept on disk, least recently used entries go first
+CACHE_BYTE_BUDGET = 8 * 1024 * 1024
+MEMORY_CACHE_ENTRIES = 256
+# other Kodi processes may change an entry, so the in-process copy is only trusted this long
+MEMORY_CACHE_TTL = 60
+VACUUM_INTERVAL = 60 * 60 * 24
+
 
 class Cache(object):
-    """Caches Python values as JSON."""
+    """Caches Python values as zlib compressed JSON.
+
+    Values live in a SQLite store in the add-on profile, shared by all plugin invocations and the
+    service and kept across Kodi restarts, with a small in-process LRU in front of it."""
+
+    _memory = OrderedDict()
+    _lock = threading.RLock()
+    _db = None
 
-    def __init__(self, key_prefix=""):
+    def __init__(self, key_prefix="", name=""):
         self.key_prefix = key_prefix
-        self._win = xbmcgui.Window(10000)
+        # metrics are reported per name, e.g. cache.search.hits
+        self.name = name or key_prefix or "default"
 
-    def set(self, key, value, expires=60 * 60 * 24 * 7):
+    def set(self, key, value, expires=60 * 60 * 24 * 7, stale=0):
+        """Caches value for expires seconds, get_with_state keeps serving it as stale for stale more seconds."""
 
         log(__name__, f"caching {key}")
         if self.key_prefix:
@@ -22,24 +43,192 @@ class Cache(object):
 
         expires += time()
 
-        cache_data_str = json.dumps(dict(value=value, expires=expires))
-
-        self._win.setProperty(key, cache_data_str)
+        cache_data = zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+
+        with self._lock, metrics.timed(f"cache.{self.name}.set"):
+            self._remember(key, value, expires)
+            db = self._get_database()
+            if db is None:
+                return
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                try:
+                    db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, cache_data, expires, len(cache_data), time(), expires + stale))
+                    self._evict(db)
+                    db.execute("COMMIT")
+                except sqlite3.Error:
+                    db.execute("ROLLBACK")
+                    raise
+                self._vacuum(db)
+            except sqlite3.Error as e:
+                log(__name__, f"failed to store {key}: {e}")
 
     def get(self, key, default=None):
+        return self.get_with_state(key, default, allow_stale=False)[0]
+
+    def get_with_state(self, key, default=None, allow_stale=True):
+        """Returns (value, stale), stale values are past their expiry but within their stale window."""
+        with metrics.timed(f"cache.{self.name}.get"):
+            result = self._get_with_state(key, allow_stale)
+        if result is None:
+            metrics.increment(f"cache.{self.name}.misses")
+            return default, False
+        metrics.increment(f"cache.{self.name}.stale_hits" if result[1] else f"cache.{self.name}.hits")
+        return result
+
+    def _get_with_state(self, key, allow_stale):
 
         log(__name__, f"got request for {key} from cache")
-        result = default
+        result = None
 
         if self.key_prefix:
             key = f"{self.key_prefix}:{key}"
 
-        cache_data_str = self._win.getProperty(key)
-
-        if cache_data_str:
-            cache_data = json.loads(cache_data_str)
-            if cache_data["expires"] > time():
-                result = cache_data["value"]
-                log(__name__, f"got {key} from cache")
+        now = time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[0] > now:
+                self._memory.move_to_end(key)
+                log(__name__, f"got {key} from memory cache")
+                return entry[1], False
+
+            db = self._get_database()
+            if db is None:
+                return result
+            try:
+                row = db.execute("SELECT value, expires, stale_until FROM cache WHERE key=?", (key,)).fetchone()
+                if row and (row[1] > now or (allow_stale and row[2] > now)):
+                    db.execute("UPDATE cache SET last_used=? WHERE key=?", (now, key))
+                    value = self._decode(row[0])
+                    if row[1] > now:
+                        self._remember(key, value, row[1])
+                        log(__name__, f"got {key} from cache")
+                    else:
+                        log(__name__, f"got stale {key} from cache")
+                    result = value, row[1] <= now
+                elif row and row[2] <= now:
+                    db.execute("DELETE FROM cache WHERE key=?", (key,))
+            except (sqlite3.Error, ValueError, zlib.error) as e:
+                log(__name__, f"failed to read {key}: {e}")
 
         return result
+
+    def delete(self, key):
+        if self.key_prefix:
+            key = f"{self.key_prefix}:{key}"
+        with self._lock:
+            self._memory.pop(key, None)
+            db = self._get_database()
+            if db is None:
+                return
+            try:
+                db.execute("DELETE FROM cache WHERE key=?", (key,))
+            except sqlite3.Error as e:
+                log(__name__, f"failed to delete {key}: {e}")
+
+    def stats(self):
+        """Returns the number of entries and compressed bytes this cache holds on disk."""
+        with self._lock:
+            db = self._get_database()
+            if db is None:
+                return {"entries": 0, "bytes": 0}
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE key LIKE ?",
+                                       (f"{self.key_prefix}:%" if self.key_prefix else "%",)).fetchone()
+        return {"entries": entries, "bytes": size}
+
+    def claim(self, key, expires):
+        """Atomically takes a lease on key for expires seconds, across all Kodi processes.
+
+        Returns False while another caller holds an unexpired lease, release gives it back early."""
+        if self.key_prefix:
+            key = f"{self.key_prefix}:{key}"
+        now = time()
+        with self._lock:
+            db = self._get_database()
+            if db is None:
+                return True
+            try:
+                db.execute("BEGIN IMMEDIATE")
+                db.execute("DELETE FROM leases WHERE key=? AND expires<=?", (key, now))
+                claimed = db.execute("INSERT OR IGNORE INTO leases VALUES (?, ?)", (key, now + expires)).rowcount == 1
+                db.execute("COMMIT")
+                return claimed
+            except sqlite3.Error as e:
+                log(__name__, f"failed to claim {key}: {e}")
+                if db.in_transaction:
+                    db.execute("ROLLBACK")
+                return True
+
+    def release(self, key):
+        if self.key_prefix:
+            key = f"{self.key_prefix}:{key}"
+        with self._lock:
+            db = self._get_database()
+            if db is None:
+                return
+            try:
+                db.execute("DELETE FROM leases WHERE key=?", (key,))
+            except sqlite3.Error as e:
+                log(__name__, f"failed to release {key}: {e}")
+
+    @staticmethod
+    def _decode(cache_data):
+        # entries written before compression was added are plain JSON text
+        if isinstance(cache_data, str):
+            return json.loads(cache_data)
+        return json.loads(zlib.decompress(cache_data).decode("utf-8"))
+
+    def _remember(self, key, value, expires):
+        self._memory[key] = (min(expires, time() + MEMORY_CACHE_TTL), value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > MEMORY_CACHE_ENTRIES:
+            self._memory.popitem(last=False)
+
+    @classmethod
+    def _get_database(cls):
+        if cls._db is None:
+            try:
+                db = open_database(CACHE_DATABASE)
+                db.execute("CREATE TABLE IF NOT EXISTS cache ("
+                           "key TEXT PRIMARY KEY, value BLOB, expires REAL, size INTEGER, last_used REAL, "
+                           "stale_until REAL)")
+                if "stale_until" not in [column[1] for column in db.execute("PRAGMA table_info(cache)")]:
+                    db.execute("ALTER TABLE cache ADD COLUMN stale_until REAL DEFAULT 0")
+                db.execute("CREATE INDEX IF NOT EXISTS cache_last_used ON cache (last_used)")
+                db.execute("CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, expires REAL)")
+                db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+                cls._db = db
+            except sqlite3.Error as e:
+                log(__name__, f"persistent cache unavailable, caching in memory only: {e}")
+        return cls._db
+
+    @staticmethod
+    def _evict(db):
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()
+        if total <= CACHE_BYTE_BUDGET:
+            return
+        db.execute("DELETE FROM cache WHERE stale_until<=?", (time(),))
+        evicted = []
+        (total,) = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()
+        for key, size in db.execute("SELECT key, size FROM cache ORDER BY last_used").fetchall():
+            if total <= CACHE_BYTE_BUDGET:
+                break
+            evicted.append((key,))
+            total -= size
+        db.executemany("DELETE FROM cache WHERE key=?", evicted)
+        metrics.increment("cache.store.evictions", len(evicted))
+        log(__name__, f"evicted {len(evicted)} entries")
+
+    @staticmethod
+    def _vacuum(db):
+        """Drops expired entries and compacts the database file once a day."""
+        now = time()
+        row = db.execute("SELECT value FROM meta WHERE key='last_vacuum'").fetchone()
+        if row and now - row[0] < VACUUM_INTERVAL:
+            return
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('last_vacuum', ?)", (now,))
+        db.execute("DELETE FROM cache WHERE stale_until<=?", (now,))
+        db.execute("DELETE FROM leases WHERE expires<=?", (now,))
+        db.execute("VACUUM")
+        log(__name__, "vacuumed cache")
@@ -1,17 +1,58 @@
 from urllib.parse import unquote
-from difflib import SequenceMatcher
+from time import sleep
+from types import MappingProxyType
 import json
+import re
+import threading
 import xml.etree.ElementTree as ET
 
 import xbmc
 import xbmcaddon
 
+from resources.lib import metrics
+from resources.lib.cache import Cache
+from resources.lib.matcher import is_same_title, normalize_title, prepare, similarity
 from resources.lib.utilities import log, normalize_string
 
 # Simple cache for library queries to avoid repeated calls
 _library_cache = {}
 _cache_max_age = 300  # 5 minutes
 
+# guessit answers never change for a filename, keep them around for long
+_guessit_cache = Cache(key_prefix="guessit", name="guessit")
+GUESSIT_CACHE_TTL = 60 * 60 * 24 * 90
+GUESSIT_TIMEOUT = 10
+# filename -> Event of the guessit request in flight in this process
+_guessit_requests = {}
+_guessit_requests_lock = threading.Lock()
+
+# Parent IDs of shows, by tvshowid and by title, until the library's shows change
+_show_ids_cache = Cache(key_prefix="show_ids", name="show_ids")
+SHOW_IDS_CACHE_TTL = 60 * 60 * 24 * 30
+
+# clean_feature_release_name keeps release names at least this similar to the title as they are
+RELEASE_NAME_MATCH_RATIO = 0.3
+
+# Release name parsing, release names below this confidence are handed to the guessit API
+RELEASE_CONFIDENCE_THRESHOLD = 0.6
+# more episodes follow an E or a dash (S01E01E02, S01E01-E02, S01E01-02), never 10bit or 1080p
+_RELEASE_EPISODE = re.compile(r"(?<![a-z0-9])s(\d{1,2})[ ._-]?e(\d{1,3})"
+                              r"((?:(?:[ ._]?-[ ._]?e?|[ ._-]?e)\d{1,3}(?![0-9a-z]))*)"
+                              r"|(?<![a-z0-9])(\d{1,2})x(\d{2,3})(?![0-9])", re.IGNORECASE)
+_RELEASE_MORE_EPISODES = re.compile(r"\d{1,3}")
+_RELEASE_YEAR = re.compile(r"(?<![0-9])(19[0-9]{2}|20[0-9]{2})(?![0-9])")
+_RELEASE_SCREEN_SIZE = re.compile(r"(?<![a-z0-9])(2160p|1080[pi]|720p|576[pi]|480[pi]|4k)(?![a-z0-9])", re.IGNORECASE)
+_RELEASE_SOURCE = re.compile(r"(?<![a-z0-9])(blu-?ray|bd-?rip|br-?rip|bdremux|remux|web-?dl|web-?rip|web|hdtv|"
+                             r"pdtv|dvd-?rip|dvd|hd-?rip|hdcam|cam|telesync|ts)(?![a-z0-9])", re.IGNORECASE)
+_RELEASE_OTHER = re.compile(r"(?<![a-z0-9])([xh][ .]?26[45]|hevc|avc|xvid|divx|10bit|hdr|proper|repack|"
+                            r"internal|extended|unrated|multi|dual)(?![a-z0-9])", re.IGNORECASE)
+_RELEASE_GROUP = re.compile(r"-([a-z0-9]+)(?:\[[^]]*\])?$", re.IGNORECASE)
+_RELEASE_EXTENSION = re.compile(r"\.[a-z0-9]{2,4}$", re.IGNORECASE)
+_RELEASE_SOURCES = {"bluray": "Blu-ray", "bdrip": "Blu-ray", "brrip": "Blu-ray", "bdremux": "Blu-ray",
+                    "remux": "Blu-ray", "webdl": "Web", "webrip": "Web", "web": "Web", "hdtv": "HDTV",
+                    "pdtv": "TV", "dvdrip": "DVD", "dvd": "DVD", "hdrip": "HD-DVD", "hdcam": "HD Camera",
+                    "cam": "Camera", "telesync": "Telesync", "ts": "Telesync"}
+
 def _get_cache_key(method, params):
     """Generate a cache key for library queries"""
     import hashlib
@@ -30,10 +71,14 @@ def _get_from_cache(method, params):
         cache_entry = _library_cache[cache_key]
         if _is_cache_valid(cache_entry):
             log(__name__, f"📋 Cache hit for {method}")
+            metrics.increment("cache.library.hits")
             return cache_entry['result']
         else:
             # Remove expired entry
             del _library_cache[cache_key]
+            metrics.increment("cache.library.evictions")
+            metrics.set_gauge("cache.library.entries", len(_library_cache))
+    metrics.increment("cache.library.misses")
     return None
 
 def _store_in_cache(method, params, result):
@@ -44,15 +89,69 @@ def _store_in_cache(method, params, result):
         'result': result,
         'timestamp': time.time()
     }
+    metrics.set_gauge("cache.library.entries", len(_library_cache))
     log(__name__, f"📋 Cached result for {method}")
 
 __addon__ = xbmcaddon.Addon()
 
 
+# InfoLabels get_media_data reads, fetched together as one snapshot of the playing item
+PLAYER_INFO_LABELS = ("VideoPlayer.Year", "VideoPlayer.Season", "VideoPlayer.Episode", "VideoPlayer.TVshowtitle",
+                      "VideoPlayer.OriginalTitle", "VideoPlayer.Title", "VideoPlayer.DBID", "VideoPlayer.TvShowDBID",
+                      "VideoPlayer.IMDBNumber", "VideoPlayer.UniqueID(imdb)", "VideoPlayer.UniqueID(tmdb)",
+                      "VideoPlayer.UniqueID(imdbepisode)", "VideoPlayer.UniqueID(tmdbepisode)",
+                      "VideoPlayer.TvShow.IMDBNumber", "VideoPlayer.TvShow.UniqueID(tmdb)",
+                      "ListItem.Property(TvShow.IMDBNumber)", "ListItem.IMDBNumber")
+
+
 def get_file_path():
     return xbmc.Player().getPlayingFile()
 
 
+def get_player_context():
+    """Returns an immutable snapshot of the playing item: its InfoLabels plus its path under "file".
+
+    All labels are read in a single XBMC.GetInfoLabels call instead of one getInfoLabel round trip
+    each, falling back to those when the JSON-RPC call fails."""
+    with metrics.timed("player_context.get"):
+        labels = _jsonrpc("XBMC.GetInfoLabels", {"labels": list(PLAYER_INFO_LABELS)}, use_cache=False)
+        if labels:
+            metrics.increment("player_context.round_trips")
+        else:
+            labels = {label: xbmc.getInfoLabel(label) for label in PLAYER_INFO_LABELS}
+            metrics.increment("player_context.round_trips", len(PLAYER_INFO_LABELS))
+        context = {label: labels.get(label) or "" for label in PLAYER_INFO_LABELS}
+        context["file"] = get_file_path()
+    metrics.increment("player_context.labels", len(PLAYER_INFO_LABELS))
+    return MappingProxyType(context)
+
+
+def get_item_context(item):
+    """Returns a snapshot like get_player_context for a video item from JSON-RPC, e.g. of a playlist.
+
+    item needs the title, originaltitle, year, showtitle, season, episode, tvshowid, imdbnumber,
+    uniqueid and file properties. Labels without a matching property are left empty."""
+    context = {label: "" for label in PLAYER_INFO_LABELS}
+    uniqueids = item.get("uniqueid") or {}
+    is_episode = item.get("type") == "episode"
+    context.update({
+        "VideoPlayer.Year": str(item.get("year") or ""),
+        "VideoPlayer.Season": str(item["season"]) if is_episode and item.get("season", -1) >= 0 else "",
+        "VideoPlayer.Episode": str(item["episode"]) if is_episode and item.get("episode", -1) >= 0 else "",
+        "VideoPlayer.TVshowtitle": item.get("showtitle") or "",
+        "VideoPlayer.OriginalTitle": item.get("originaltitle") or (item.get("title") if item.get("type") == "movie"
+                                                                   else "") or "",
+        "VideoPlayer.Title": item.get("title") or item.get("label") or "",
+        "VideoPlayer.DBID": str(item["id"]) if item.get("type") == "movie" and item.get("id") else "",
+        "VideoPlayer.TvShowDBID": str(item["tvshowid"]) if (item.get("tvshowid") or -1) > 0 else "",
+        "VideoPlayer.IMDBNumber": item.get("imdbnumber") or "",
+        "VideoPlayer.UniqueID(imdb)": uniqueids.get("imdb") or "",
+        "VideoPlayer.UniqueID(tmdb)": uniqueids.get("tmdb") or "",
+        "file": item.get("file") or "",
+    })
+    return MappingProxyType(context)
+
+
 # ---------- Small helpers ----------
 
 def _strip_imdb_tt(value):
@@ -93,6 +192,86 @@ def _extract_basic_tv_info(filename):
 
 
 
+def parse_release_name(filename):
+    """Parses a release name into guessit-like fields with a confidence between 0 and 1.
+
+    Returns title, type ("episode" or "movie"), year, season, episode (the first one, all of
+    them in episodes), screen_size, source and release_group, as far as they were found."""
+    name = _RELEASE_EXTENSION.sub("", filename.strip())
+    result = {"type": "movie"}
+    confidence = 0.0
+    # the title ends at the episode or year, release markers only end titles without either
+    title_end = len(name)
+
+    episode = _RELEASE_EPISODE.search(name)
+    if episode:
+        if episode.group(1):
+            season, episodes = int(episode.group(1)), [int(episode.group(2))]
+            episodes += [int(number) for number in _RELEASE_MORE_EPISODES.findall(episode.group(3) or "")]
+        else:
+            season, episodes = int(episode.group(4)), [int(episode.group(5))]
+        if len(episodes) == 2 and episodes[1] > episodes[0] and "-" in (episode.group(3) or ""):
+            episodes = list(range(episodes[0], episodes[1] + 1))
+        result.update(type="episode", season=season, episode=episodes[0], episodes=episodes)
+        title_end = episode.start()
+        confidence += 0.4
+
+    # a year right at the start is part of the title, e.g. 2001 A Space Odyssey
+    years = [year for year in _RELEASE_YEAR.finditer(name) if year.start() > 0]
+    if years:
+        year = years[-1] if not episode else years[0]
+        if not episode or year.start() < episode.start():
+            result["year"] = int(year.group(1))
+            title_end = min(title_end, year.start())
+            confidence += 0.3 if not episode else 0.05
+    # markers before the episode or year are title words, e.g. The Proper Way or Cam
+    markers_start = 0 if title_end == len(name) else title_end
+
+    for key, pattern in (("screen_size", _RELEASE_SCREEN_SIZE), ("source", _RELEASE_SOURCE)):
+        found = pattern.search(name, markers_start)
+        if found:
+            value = found.group(1).lower()
+            result[key] = _RELEASE_SOURCES.get(value.replace("-", ""), value) if key == "source" else value
+            title_end = min(title_end, found.start())
+            confidence += 0.1
+    other = _RELEASE_OTHER.search(name, markers_start)
+    if other:
+        title_end = min(title_end, other.start())
+    # without an episode or year a title word may have been taken for a marker
+    cut_short = not markers_start and title_end < len(name)
+
+    # numbers after a dash are episodes and the dash of WEB-DL is no group separator
+    group = _RELEASE_GROUP.search(name)
+    if group and group.start() >= title_end and not group.group(1).isdigit() and \
+            not any(source.start() <= group.start() < source.end() for source in _RELEASE_SOURCE.finditer(name)):
+        result["release_group"] = group.group(1)
+        confidence += 0.05
+
+    title = re.sub(r"[._]+", " ", name[:title_end])
+    title = re.sub(r"[\[(][^\])]*[\])]", " ", title)
+    title = re.sub(r"\s+", " ", title).strip(" -([")
+    if title:
+        result["title"] = title
+        confidence += 0.2 if cut_short else 0.4
+    result["confidence"] = round(min(confidence, 1.0), 2)
+    return result
+
+
+def _find_in_library(kind, title):
+    """Looks up library movies or TV shows by title in the persisted library index.
+
+    The background service builds and refreshes the index, an outdated index is used as it is. Until
+    the index exists, a bounded JSON-RPC lookup stands in for it."""
+    from resources.lib.library_index import get_library_index, lookup_library
+
+    library_index = get_library_index()
+    if not library_index or not library_index.is_built():
+        with metrics.timed("library_index.lookup"):
+            return lookup_library(kind, title)
+    with metrics.timed("library_index.find"):
+        return library_index.find(kind, title)
+
+
 def _query_kodi_library_for_movie(movie_title, year=None, dbid=None):
     """Query Kodi library for movie IDs"""
     if not movie_title and not dbid:
@@ -112,26 +291,11 @@ def _query_kodi_library_for_movie(movie_title, year=None, dbid=None):
 
         # Search by title if no dbid or dbid query failed
         if movie_title:
-            query_params = {
-                "properties": ["imdbnumber", "uniqueid", "title", "year"],
-                "limits": {"end": 100}
-            }
-            result = _jsonrpc("VideoLibrary.GetMovies", query_params, use_cache=False)
-
-            if result and "movies" in result and result["movies"]:
-                matching_movies = []
-                for movie in result["movies"]:
-                    movie_title_lib = movie.get('title', '').lower()
-                    search_title_lower = movie_title.lower()
-
-                    if (search_title_lower in movie_title_lib or
-                        movie_title_lib in search_title_lower):
-                        matching_movies.append(movie)
-
-                if matching_movies:
-                    best_movie = _select_best_movie_match(matching_movies, movie_title, year)
-                    if best_movie:
-                        return _extract_movie_ids(best_movie)
+            matching_movies = _find_in_library("movie", movie_title)
+            if matching_movies:
+                best_movie = _select_best_movie_match(matching_movies, movie_title, year)
+                if best_movie:
+                    return _extract_movie_ids(best_movie)
 
     except Exception as e:
         log(__name__, f"Failed to query library for movie: {e}")
@@ -148,6 +312,7 @@ def _select_best_movie_match(movies, search_title, search_year=None):
 
     best_score = 0
     best_movie = None
+    search = prepare(search_title or "")
 
     for movie in movies:
         score = 0
@@ -156,11 +321,11 @@ def _select_best_movie_match(movies, search_title, search_year=None):
 
         # Title matching score
         if search_title:
-            title_similarity = SequenceMatcher(None, search_title.lower(), movie_title.lower()).ratio() * 100
+            title_similarity = similarity(search, movie_title) * 100
             score += title_similarity
 
             # Exact title match bonus
-            if search_title.lower() == movie_title.lower():
+            if is_same_title(search_title, movie_title):
                 score += 50
 
         # Year matching bonus
@@ -202,36 +367,90 @@ def _extract_movie_ids(movie):
     return movie_imdb, movie_tmdb, file_path
 
 def _query_kodi_library_for_show(show_title, year=None):
-    """Query Kodi library for TV show IDs"""
+    """Query Kodi library for TV show IDs, cached per show title"""
     if not show_title:
         return None, None, None
 
+    cache_key = _get_show_ids_key("title", f"{normalize_title(show_title)}:{year or ''}")
+    cached_ids = _show_ids_cache.get(cache_key)
+    if cached_ids is not None:
+        return tuple(cached_ids)
+
     try:
-        query_params = {
-            "properties": ["imdbnumber", "uniqueid", "title", "episodeguide"],
-            "limits": {"end": 50}
-        }
-        result = _jsonrpc("VideoLibrary.GetTVShows", query_params, use_cache=False)
-
-        if result and "tvshows" in result and result["tvshows"]:
-            matching_shows = []
-            for show in result["tvshows"]:
-                show_title_lib = show.get('title', '').lower()
-                search_title_lower = show_title.lower()
-                if (search_title_lower in show_title_lib or
-                    show_title_lib in search_title_lower):
-                    matching_shows.append(show)
-
-            if matching_shows:
-                best_show = _select_best_show_match(matching_shows, show_title, year)
-                if best_show:
-                    return _extract_show_ids(best_show)
+        show_ids = None, None, None
+        matching_shows = _find_in_library("tvshow", show_title)
+        if matching_shows:
+            best_show = _select_best_show_match(matching_shows, show_title, year)
+            if best_show:
+                show_ids = _extract_show_ids(best_show)
+        _show_ids_cache.set(cache_key, list(show_ids), expires=SHOW_IDS_CACHE_TTL)
+        return show_ids
 
     except Exception as e:
         log(__name__, f"Failed to query library for show: {e}")
 
     return None, None, None
 
+def _get_show_ids_key(kind, value):
+    """Show ID cache keys carry the library generation, so a new generation drops all entries"""
+    return f"{_show_ids_cache.get('generation', 0)}:{kind}:{value}"
+
+
+def invalidate_show_ids():
+    """Drops the cached parent IDs of all shows, called when the library's shows change"""
+    import time
+    _show_ids_cache.set("generation", time.time(), expires=SHOW_IDS_CACHE_TTL)
+
+
+def _get_show_ids_from_library(tvshowid):
+    """Get parent show (imdb_id, tmdb_id) of a library show, cached per tvshowid"""
+    cache_key = _get_show_ids_key("tvshowid", tvshowid)
+    cached_ids = _show_ids_cache.get(cache_key)
+    if cached_ids is not None:
+        return tuple(cached_ids)
+
+    parent_imdb = None
+    parent_tmdb = None
+    try:
+        result = _jsonrpc("VideoLibrary.GetTVShowDetails",
+                          {"tvshowid": int(tvshowid), "properties": ["episodeguide", "imdbnumber", "uniqueid"]},
+                          use_cache=False)
+        if not result or "tvshowdetails" not in result:
+            return parent_imdb, parent_tmdb
+        tvshow_details = result["tvshowdetails"]
+
+        # parent IMDb
+        imdb_digits = _strip_imdb_tt(str(tvshow_details.get("imdbnumber") or ""))
+        if imdb_digits and 6 <= len(imdb_digits) <= 8:
+            parent_imdb = int(imdb_digits)
+
+        # parent TMDb (first try uniqueid, then episodeguide fallback)
+        uniqueids = tvshow_details.get("uniqueid", {})
+        if isinstance(uniqueids, dict):
+            tmdb_raw = uniqueids.get("tmdb", "")
+            if tmdb_raw and str(tmdb_raw).isdigit():
+                parent_tmdb = int(tmdb_raw)
+
+        if not parent_tmdb:
+            episodeguideXML = tvshow_details.get("episodeguide")
+            if episodeguideXML:
+                try:
+                    episodeguide = ET.fromstring(episodeguideXML)
+                    if episodeguide.text:
+                        guide_json = json.loads(episodeguide.text)
+                        tmdb = guide_json.get("tmdb")
+                        if tmdb and str(tmdb).isdigit():
+                            parent_tmdb = int(tmdb)
+                except (ET.ParseError, json.JSONDecodeError, ValueError, AttributeError):
+                    pass  # Silent fail for malformed XML/JSON
+    except (ValueError, KeyError) as e:
+        log(__name__, f"Failed to extract TV show IDs via JSON-RPC: {e}")
+        return parent_imdb, parent_tmdb
+
+    _show_ids_cache.set(cache_key, [parent_imdb, parent_tmdb], expires=SHOW_IDS_CACHE_TTL)
+    return parent_imdb, parent_tmdb
+
+
 def _select_best_show_match(tvshows, search_title, search_year=None):
     """Select the best matching TV show from library results"""
     if not tvshows:
@@ -242,6 +461,7 @@ def _select_best_show_match(tvshows, search_title, search_year=None):
 
     best_score = 0
     best_show = None
+    search = prepare(search_title or "")
 
     for show in tvshows:
         score = 0
@@ -251,15 +471,15 @@ def _select_best_show_match(tvshows, search_title, search_year=None):
 
         # Title matching (0-100)
         if search_title:
-            title_similarity = SequenceMatcher(None, search_title.lower(), show_title.lower()).ratio() * 100
+            title_similarity = similarity(search, show_title) * 100
             if show_orig_title:
-                orig_title_similarity = SequenceMatcher(None, search_title.lower(), show_orig_title.lower()).ratio() * 100
+                orig_title_similarity = similarity(search, show_orig_title) * 100
                 score += max(title_similarity, orig_title_similarity)
             else:
                 score += title_similarity
 
             # Exact match bonus
-            if search_title.lower() == show_title.lower() or search_title.lower() == show_orig_title.lower():
+            if is_same_title(search_title, show_title) or (show_orig_title and is_same_title(search_title, show_orig_title)):
                 score += 50
 
         # Year bonus (0-25)
@@ -313,7 +533,51 @@ def _extract_show_ids(tvshow):
     return parent_imdb, parent_tmdb, tvshow_id
 
 def _call_guessit_api(filename):
-    """Call OpenSubtitles guessit API to parse filename"""
+    """Call OpenSubtitles guessit API to parse filename, answers are cached per filename.
+
+    Identical requests are coalesced: callers wait for the one in flight, in this process or any
+    other Kodi process, and read its answer from the cache."""
+    data = _guessit_cache.get(filename)
+    if data is not None:
+        log(__name__, f"Guessit result for {filename} from cache")
+        return data
+
+    with _guessit_requests_lock:
+        in_flight = _guessit_requests.get(filename)
+        if in_flight is None:
+            _guessit_requests[filename] = threading.Event()
+    if in_flight is not None:
+        in_flight.wait(GUESSIT_TIMEOUT)
+        return _guessit_cache.get(filename)
+
+    try:
+        claimed = _guessit_cache.claim(f"request:{filename}", GUESSIT_TIMEOUT)
+        if not claimed:
+            for _ in range(GUESSIT_TIMEOUT * 4):
+                sleep(0.25)
+                data = _guessit_cache.get(filename)
+                if data is not None:
+                    return data
+                # the other request failed without an answer, take over
+                claimed = _guessit_cache.claim(f"request:{filename}", GUESSIT_TIMEOUT)
+                if claimed:
+                    break
+            else:
+                log(__name__, f"Timed out waiting for guessit request of {filename}")
+                return None
+        try:
+            data = _request_guessit(filename)
+            if data is not None:
+                _guessit_cache.set(filename, data, expires=GUESSIT_CACHE_TTL)
+            return data
+        finally:
+            _guessit_cache.release(f"request:{filename}")
+    finally:
+        with _guessit_requests_lock:
+            _guessit_requests.pop(filename).set()
+
+
+def _request_guessit(filename):
     try:
         import urllib.request
         import urllib.parse
@@ -339,7 +603,7 @@ def _call_guessit_api(filename):
         log(__name__, f"🔍 Calling guessit API for: {filename}")
         
         # Make the request
-        with urllib.request.urlopen(req) as response:
+        with urllib.request.urlopen(req, timeout=GUESSIT_TIMEOUT) as response:
             if response.getcode() == 200:
                 data = json.loads(response.read().decode('utf-8'))
                 log(__name__, f"✅ Guessit API response: {data}")
@@ -356,7 +620,8 @@ def _jsonrpc(method, params=None, use_cache=True):
     """JSON-RPC call with caching and error handling"""
     # Check cache first for library queries
     if use_cache and method.startswith('VideoLibrary.'):
-        cached_result = _get_from_cache(method, params)
+        with metrics.timed("cache.library.get"):
+            cached_result = _get_from_cache(method, params)
         if cached_result is not None:
             return cached_result
 
@@ -390,14 +655,17 @@ def _jsonrpc(method, params=None, use_cache=True):
         return None
 
 
-def get_media_data():
+def get_media_data(context=None):
+    """Collects title, season/episode and IDs of the playing item, or of the item context was taken from."""
+    if context is None:
+        context = get_player_context()
 
     item = {"query": None,
-            "year": xbmc.getInfoLabel("VideoPlayer.Year"),
-            "season_number": str(xbmc.getInfoLabel("VideoPlayer.Season")),
-            "episode_number": str(xbmc.getInfoLabel("VideoPlayer.Episode")),
-            "tv_show_title": normalize_string(xbmc.getInfoLabel("VideoPlayer.TVshowtitle")),
-            "original_title": normalize_string(xbmc.getInfoLabel("VideoPlayer.OriginalTitle")),
+            "year": context["VideoPlayer.Year"],
+            "season_number": str(context["VideoPlayer.Season"]),
+            "episode_number": str(context["VideoPlayer.Episode"]),
+            "tv_show_title": normalize_string(context["VideoPlayer.TVshowtitle"]),
+            "original_title": normalize_string(context["VideoPlayer.OriginalTitle"]),
             "parent_tmdb_id": None,
             "parent_imdb_id": None,
             "imdb_id": None,
@@ -410,7 +678,7 @@ def get_media_data():
         log(__name__, "⚠️  All InfoLabels are empty - likely non-library file playback")
         
         try:
-            playing_file = get_file_path()
+            playing_file = context["file"]
             if playing_file:
                 log(__name__, f"📁 Playing file path: {playing_file}")
                 import os
@@ -443,9 +711,12 @@ def get_media_data():
                         item["episode_number"] = episode_num
                         log(__name__, f"📚 Not in library, will search by title: '{show_title}' S{season_num}E{episode_num}")
                 else:
-                    # STEP 3: Fallback to guessit API for complex parsing
-                    log(__name__, "🔍 Basic parsing failed, trying guessit API...")
-                    guessed_data = _call_guessit_api(filename)
+                    # STEP 3: Parse the release name locally, asking the guessit API only when unsure
+                    guessed_data = parse_release_name(filename)
+                    log(__name__, f"🔍 Release name parsed with confidence {guessed_data['confidence']}: {guessed_data}")
+                    if guessed_data["confidence"] < RELEASE_CONFIDENCE_THRESHOLD:
+                        log(__name__, "🔍 Low confidence, trying guessit API...")
+                        guessed_data = _call_guessit_api(filename) or guessed_data
                     if guessed_data:
                         if guessed_data.get("type") == "episode":
                             # TV show episode
@@ -485,22 +756,22 @@ def get_media_data():
     
     # ---------------- TV SHOW (Episode) ----------------
     if item["tv_show_title"]:
-        item["tvshowid"] = xbmc.getInfoLabel("VideoPlayer.TvShowDBID")
+        item["tvshowid"] = context["VideoPlayer.TvShowDBID"]
         item["query"] = item["tv_show_title"]
         item["year"] = None  # Safer for OS search
 
         # 1) Try to get TRUE parent show IDs first (these are more reliable)
         try:
             # True parent show IMDb ID from TvShow properties
-            parent_imdb_raw = (xbmc.getInfoLabel("ListItem.Property(TvShow.IMDBNumber)")
-                               or xbmc.getInfoLabel("VideoPlayer.TvShow.IMDBNumber"))
+            parent_imdb_raw = (context["ListItem.Property(TvShow.IMDBNumber)"]
+                               or context["VideoPlayer.TvShow.IMDBNumber"])
             imdb_digits = _strip_imdb_tt(parent_imdb_raw)
             if imdb_digits and 6 <= len(imdb_digits) <= 8:
                 item["parent_imdb_id"] = int(imdb_digits)
                 log(__name__, f"TRUE Parent Show IMDb ID: {item['parent_imdb_id']}")
 
             # True parent show TMDb ID (less common but check if available)
-            parent_tmdb_raw = xbmc.getInfoLabel("VideoPlayer.TvShow.UniqueID(tmdb)")
+            parent_tmdb_raw = context["VideoPlayer.TvShow.UniqueID(tmdb)"]
             if parent_tmdb_raw and parent_tmdb_raw.isdigit():
                 item["parent_tmdb_id"] = int(parent_tmdb_raw)
                 log(__name__, f"TRUE Parent Show TMDb ID: {item['parent_tmdb_id']}")
@@ -511,15 +782,15 @@ def get_media_data():
         if not item.get("parent_imdb_id") and not item.get("parent_tmdb_id"):
             try:
                 # These might be episode IDs, not parent IDs
-                possible_episode_imdb = (xbmc.getInfoLabel("VideoPlayer.UniqueID(imdb)")
-                                         or xbmc.getInfoLabel("VideoPlayer.IMDBNumber")
-                                         or xbmc.getInfoLabel("ListItem.IMDBNumber"))
+                possible_episode_imdb = (context["VideoPlayer.UniqueID(imdb)"]
+                                         or context["VideoPlayer.IMDBNumber"]
+                                         or context["ListItem.IMDBNumber"])
                 imdb_digits = _strip_imdb_tt(possible_episode_imdb)
                 if imdb_digits and 6 <= len(imdb_digits) <= 8:
                     item["imdb_id"] = int(imdb_digits)
                     log(__name__, f"Episode-specific IMDb ID (not parent): {item['imdb_id']}")
 
-                possible_episode_tmdb = xbmc.getInfoLabel("VideoPlayer.UniqueID(tmdb)")
+                possible_episode_tmdb = context["VideoPlayer.UniqueID(tmdb)"]
                 if possible_episode_tmdb and possible_episode_tmdb.isdigit():
                     item["tmdb_id"] = int(possible_episode_tmdb)
                     log(__name__, f"Episode-specific TMDb ID (not parent): {item['tmdb_id']}")
@@ -528,57 +799,21 @@ def get_media_data():
 
         # 3) If still missing, fall back to library JSON-RPC (when the show is in the library)
         if len(item["tvshowid"]) != 0 and (not item["parent_tmdb_id"] or not item["parent_imdb_id"]):
-            try:
-                TVShowDetails = xbmc.executeJSONRPC(
-                    '{ "jsonrpc": "2.0", "id":"1", "method": "VideoLibrary.GetTVShowDetails", '
-                    '"params":{"tvshowid":' + item["tvshowid"] + ', "properties": ["episodeguide", "imdbnumber", "uniqueid"]} }'
-                )
-                TVShowDetails_dict = json.loads(TVShowDetails)
-                if "result" in TVShowDetails_dict and "tvshowdetails" in TVShowDetails_dict["result"]:
-                    tvshow_details = TVShowDetails_dict["result"]["tvshowdetails"]
-
-                    # parent IMDb
-                    if not item["parent_imdb_id"]:
-                        imdb_raw = str(tvshow_details.get("imdbnumber") or "")
-                        imdb_digits = _strip_imdb_tt(imdb_raw)
-                        if imdb_digits and 6 <= len(imdb_digits) <= 8:
-                            item["parent_imdb_id"] = int(imdb_digits)
-                            log(__name__, f"Parent IMDb via JSON-RPC: {item['parent_imdb_id']}")
-
-                    # parent TMDb (first try uniqueid, then episodeguide fallback)
-                    if not item["parent_tmdb_id"]:
-                        # Method 1: Try uniqueid field first (more reliable)
-                        uniqueids = tvshow_details.get("uniqueid", {})
-                        if isinstance(uniqueids, dict):
-                            tmdb_raw = uniqueids.get("tmdb", "")
-                            if tmdb_raw and str(tmdb_raw).isdigit():
-                                item["parent_tmdb_id"] = int(tmdb_raw)
-                                log(__name__, f"Parent TMDb via JSON-RPC (uniqueid): {item['parent_tmdb_id']}")
-
-                        # Method 2: Fallback to episodeguide if uniqueid didn't work
-                        if not item["parent_tmdb_id"]:
-                            episodeguideXML = tvshow_details.get("episodeguide")
-                            if episodeguideXML:
-                                try:
-                                    episodeguide = ET.fromstring(episodeguideXML)
-                                    if episodeguide.text:
-                                        guide_json = json.loads(episodeguide.text)
-                                        tmdb = guide_json.get("tmdb")
-                                        if tmdb and str(tmdb).isdigit():
-                                            item["parent_tmdb_id"] = int(tmdb)
-                                            log(__name__, f"Parent TMDb via JSON-RPC (episodeguide): {item['parent_tmdb_id']}")
-                                except (ET.ParseError, json.JSONDecodeError, ValueError):
-                                    pass  # Silent fail for malformed XML/JSON
-            except (json.JSONDecodeError, ET.ParseError, ValueError, KeyError) as e:
-                log(__name__, f"Failed to extract TV show IDs via JSON-RPC: {e}")
+            parent_imdb, parent_tmdb = _get_show_ids_from_library(item["tvshowid"])
+            if not item["parent_imdb_id"] and parent_imdb:
+                item["parent_imdb_id"] = parent_imdb
+                log(__name__, f"Parent IMDb via JSON-RPC: {item['parent_imdb_id']}")
+            if not item["parent_tmdb_id"] and parent_tmdb:
+                item["parent_tmdb_id"] = parent_tmdb
+                log(__name__, f"Parent TMDb via JSON-RPC: {item['parent_tmdb_id']}")
 
         # 4) Try to get specific episode IDs from dedicated episode fields (if available)
         try:
-            ep_tmdb = xbmc.getInfoLabel("VideoPlayer.UniqueID(tmdbepisode)")
+            ep_tmdb = context["VideoPlayer.UniqueID(tmdbepisode)"]
             if ep_tmdb and ep_tmdb.isdigit():
                 item["tmdb_id"] = int(ep_tmdb)
                 log(__name__, f"Dedicated Episode TMDb ID: {item['tmdb_id']}")
-            ep_imdb = xbmc.getInfoLabel("VideoPlayer.UniqueID(imdbepisode)")
+            ep_imdb = context["VideoPlayer.UniqueID(imdbepisode)"]
             ep_imdb_digits = _strip_imdb_tt(ep_imdb)
             if ep_imdb_digits and ep_imdb_digits.isdigit():
                 item["imdb_id"] = int(ep_imdb_digits)
@@ -589,18 +824,18 @@ def get_media_data():
     # ---------------- MOVIE ----------------
     elif item["original_title"]:
         item["query"] = item["original_title"]
-        movie_dbid = xbmc.getInfoLabel("VideoPlayer.DBID")
+        movie_dbid = context["VideoPlayer.DBID"]
         
         # First try to get IDs from InfoLabels (most reliable for library content)
         try:
-            imdb_raw = (xbmc.getInfoLabel("VideoPlayer.UniqueID(imdb)")
-                        or xbmc.getInfoLabel("VideoPlayer.IMDBNumber"))
+            imdb_raw = (context["VideoPlayer.UniqueID(imdb)"]
+                        or context["VideoPlayer.IMDBNumber"])
             imdb_digits = _strip_imdb_tt(imdb_raw)
             if imdb_digits and 6 <= len(imdb_digits) <= 8:
                 item["imdb_id"] = int(imdb_digits)
                 log(__name__, f"Found IMDB ID for movie from InfoLabel: {item['imdb_id']}")
 
-            tmdb_raw = xbmc.getInfoLabel("VideoPlayer.UniqueID(tmdb)")
+            tmdb_raw = context["VideoPlayer.UniqueID(tmdb)"]
             if tmdb_raw and str(tmdb_raw).isdigit():
                 tmdb_id = int(tmdb_raw)
                 if tmdb_id > 0:
@@ -698,13 +933,13 @@ def get_media_data():
             log(__name__, f"🎯 API Strategy: title search only '{item['query']}' (movie, no IDs available)")
 
     if not item.get("query"):
-        fallback_title = normalize_string(xbmc.getInfoLabel("VideoPlayer.Title"))
+        fallback_title = normalize_string(context["VideoPlayer.Title"])
         if fallback_title:
             item["query"] = fallback_title
         else:
             # Last resort: use filename
             try:
-                playing_file = get_file_path()
+                playing_file = context["file"]
                 if playing_file:
                     import os
                     filename = os.path.basename(playing_file)
@@ -805,11 +1040,13 @@ def clean_feature_release_name(title, release, movie_name=""):
     else:
         name = title
 
-    match_ratio = SequenceMatcher(None, name, release).ratio()
+    match_ratio = similarity(name, release)
     log(__name__, f"name: {name}, release: {release}, match_ratio: {match_ratio}")
-    if name in release:
+    # the ratio of a release naming the title drops with the length of the rest, check the words first
+    if name in release or f" {normalize_title(name)} " in f" {normalize_title(release)} ":
         return release
-    elif match_ratio > 0.3:
+    # on misspelled titles the trigram ratio decides like difflib's ratio did at the same threshold
+    elif match_ratio > RELEASE_NAME_MATCH_RATIO:
         return release
     else:
         return f"{name} {release}"
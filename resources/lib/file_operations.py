@@ -1,12 +1,32 @@
 
 import os
+import sqlite3
 import struct
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 
 import xbmcvfs, xbmc
 
-from urllib.parse import unquote
+from email.utils import parsedate_to_datetime
+from urllib.parse import parse_qsl, unquote, urlparse
+from resources.lib.hash_cache import get_hash_cache
 from resources.lib.utilities import log
 
+HASH_CHUNK_SIZE = 65536
+# enough to hold the marker, archive and first file headers of a rar volume
+RAR_HEADER_SIZE = 4096
+RAR5_SIGNATURE = b"Rar!\x1a\x07\x01\x00"
+
+# VFS sources where each read is a network round trip
+REMOTE_VFS_SCHEMES = ("smb://", "nfs://", "dav://", "davs://", "ftp://", "ftps://", "sftp://", "upnp://",
+                      "http://", "https://")
+IO_POOL_SIZE = 2
+HTTP_TIMEOUT = 10
+LONG_LONG_SIZE = struct.calcsize("<q")
+
 
 def get_file_data(file_original_path):
     item = {"temp": False, "rar": False, "file_original_path": file_original_path}
@@ -31,6 +51,17 @@ def get_file_data(file_original_path):
 
         item["temp"] = True
 
+        if file_original_path.lower().startswith(("http://", "https://")):
+            try:
+                http_hash = hash_http(file_original_path)
+            except Exception as e:
+                log(__name__, f"Failed to hash http stream: {e}")
+                http_hash = None
+            if http_hash:
+                item["basename"] = os.path.basename(unquote(urlparse(file_original_path.split("|")[0]).path))
+                item["file_size"], item["moviehash"] = http_hash
+            return item
+
     elif file_original_path.find("rar://") > -1:
     #    item["rar"] = True
     #    item["file_original_path"] = os.path.dirname(file_original_path[6:])
@@ -39,17 +70,74 @@ def get_file_data(file_original_path):
         item["basename"] = os.path.basename(file_original_path)
 
     elif file_original_path.find("stack://") > -1:
-        stack_path = file_original_path.split(" , ")
-        item["file_original_path"] = stack_path[0][8:]
+        stack_parts = get_stack_parts(file_original_path)
+        item["file_original_path"] = stack_parts[0]
+        item["stack_size"] = len(stack_parts)
+        # parts 2..N are hashed into the hash cache while part 1 plays
+        prefetch_stack_hashes(stack_parts[1:])
 
     if not item["temp"]:
         item["basename"]=os.path.basename(file_original_path[6:])
-        item["file_size"], item["moviehash"] = hash_file(item["file_original_path"], item["rar"])
+        item["file_size"], item["moviehash"] = cached_hash_file(item["file_original_path"], item["rar"])
     #else:
     #    item["basename"]=os.path.basename(file_original_path[6:])
     return item
 
 
+def get_stack_parts(stack_path):
+    """Splits stack://part1 , part2 , ... into the part paths, Kodi escapes commas in paths as ',,'."""
+    return [part.replace(",,", ",") for part in stack_path[stack_path.find("stack://") + 8:].split(" , ")]
+
+
+def prefetch_stack_hashes(part_paths):
+    if part_paths:
+        threading.Thread(target=_hash_stack_parts, args=(part_paths,), name="stack_hash").start()
+
+
+def _hash_stack_parts(part_paths):
+    for part_path in part_paths:
+        try:
+            cached_hash_file(part_path, False)
+        except Exception as e:
+            log(__name__, f"Failed to hash stack part {part_path}: {e}")
+
+
+def stat_file(file_path):
+    """Returns (size, mtime) of file_path without reading it, or (None, None) if the VFS can't stat it."""
+    try:
+        st = xbmcvfs.Stat(file_path)
+        size, mtime = st.st_size(), st.st_mtime()
+    except Exception as e:
+        log(__name__, f"Failed to stat {file_path}: {e}")
+        return None, None
+    if not size:
+        return None, None
+    return size, mtime
+
+
+def cached_hash_file(file_path, rar):
+    """hash_file, answered from the persistent hash cache when the file is unchanged."""
+    # rar file_path is urlencoded, see hash_file
+    size, mtime = stat_file(unquote(file_path) if rar else file_path)
+    hash_cache = get_hash_cache() if size else None
+    if hash_cache:
+        try:
+            cached = hash_cache.get(file_path, size, mtime)
+            if cached:
+                return cached
+        except sqlite3.Error as e:
+            log(__name__, f"Hash cache lookup failed: {e}")
+
+    result = hash_file(file_path, rar)
+
+    if hash_cache and result != "SizeError":
+        try:
+            hash_cache.set(file_path, size, mtime, *result)
+        except sqlite3.Error as e:
+            log(__name__, f"Hash cache save failed: {e}")
+    return result
+
+
 def hash_file(file_path, rar):
     log(__name__, f"Processing file: {file_path} - Is RAR: {rar}")
 
@@ -58,95 +146,296 @@ def hash_file(file_path, rar):
         # file_path is thus urlencoded at this point and must be unquoted
         return hash_rar(unquote(file_path))
 
-    log(__name__, "Hash Standard file")
-    long_long_format = "q"  # long long
-    byte_size = struct.calcsize(long_long_format)
+    started = time()
+    if is_remote_path(file_path):
+        log(__name__, "Hash Standard file, head and tail read in parallel")
+        file_size, buffer = read_head_tail_parallel(file_path)
+    else:
+        log(__name__, "Hash Standard file")
+        file_size, buffer = read_head_tail(file_path)
+    log(__name__, f"Read {file_path} in {(time() - started) * 1000:.1f} ms")
+
+    if buffer is None:
+        return "SizeError"
+
+    return_hash = "%016x" % sum_longs(buffer, file_size)
+    return file_size, return_hash
+
+
+def is_remote_path(file_path):
+    return file_path.lower().startswith(REMOTE_VFS_SCHEMES)
+
+
+def read_head_tail(file_path):
+    """Returns (file_size, first and last 64 KiB), the buffer is None for files too small to hash."""
     with xbmcvfs.File(file_path) as f:
         file_size = f.size()
-        hash_ = file_size
 
-        if file_size < 65536 * 2:
-            return "SizeError"
+        if file_size < HASH_CHUNK_SIZE * 2:
+            return file_size, None
 
-        buffer = f.readBytes(65536)
-        f.seek(max(0, file_size - 65536), 0)
-        buffer += f.readBytes(65536)
+        buffer = read_hash_chunk(f, file_path)
+        f.seek(max(0, file_size - HASH_CHUNK_SIZE), 0)
+        buffer += read_hash_chunk(f, file_path)
         f.close()
+    return file_size, buffer
 
-    for x in range(int(65536 / byte_size) * 2):
-        size = x * byte_size
-        (l_value,) = struct.unpack(long_long_format, buffer[size:size + byte_size])
-        hash_ += l_value
-        hash_ = hash_ & 0xFFFFFFFFFFFFFFFF
 
-    return_hash = "%016x" % hash_
-    return file_size, return_hash
+def read_hash_chunk(f, file_path):
+    """Reads the next 64 KiB of f, raising if fewer bytes arrive, e.g. on a network hiccup.
+
+    A short chunk would silently sum into a wrong hash, which the hash cache would keep."""
+    chunk = f.readBytes(HASH_CHUNK_SIZE)
+    if len(chunk) != HASH_CHUNK_SIZE:
+        raise Exception(f"Short read of {file_path}: {len(chunk)} of {HASH_CHUNK_SIZE} bytes")
+    return chunk
+
+
+def read_head_tail_parallel(file_path):
+    """read_head_tail over two VFS handles, so the head and tail round trips overlap."""
+    head = _get_io_pool().submit(_read_chunk, file_path, False)
+    tail = _get_io_pool().submit(_read_chunk, file_path, True)
+    file_size, head_chunk = head.result()
+    _, tail_chunk = tail.result()
+
+    if head_chunk is None or tail_chunk is None:
+        return file_size, None
+    return file_size, head_chunk + tail_chunk
+
+
+def _read_chunk(file_path, from_end):
+    with xbmcvfs.File(file_path) as f:
+        file_size = f.size()
+
+        if file_size < HASH_CHUNK_SIZE * 2:
+            return file_size, None
+
+        if from_end:
+            f.seek(max(0, file_size - HASH_CHUNK_SIZE), 0)
+        chunk = read_hash_chunk(f, file_path)
+        f.close()
+    return file_size, chunk
+
+
+_io_pool = None
+
+
+def _get_io_pool():
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="hash_io")
+    return _io_pool
+
+
+def hash_http(url):
+    """Hashes a http(s) stream with a HEAD and two Range requests for its first and last 64 KiB.
+
+    Returns (file_size, moviehash), or None if the server doesn't serve byte ranges."""
+    # Kodi appends request headers to stream urls: http://host/file.mkv|User-Agent=...&Referer=...
+    url, _, options = url.partition("|")
+    headers = dict(parse_qsl(options))
+
+    r = _get_http_session().head(url, headers=headers, allow_redirects=True, timeout=HTTP_TIMEOUT)
+    r.raise_for_status()
+    file_size = int(r.headers.get("Content-Length") or 0)
+    if r.headers.get("Accept-Ranges", "bytes").lower() == "none":
+        log(__name__, f"{url} does not accept range requests, no hash")
+        return None
+    if file_size < HASH_CHUNK_SIZE * 2:
+        log(__name__, f"{url} size unknown or too small to hash: {file_size}")
+        return None
+
+    # Last-Modified stands in for the mtime of a VFS file
+    try:
+        mtime = int(parsedate_to_datetime(r.headers["Last-Modified"]).timestamp())
+    except (KeyError, TypeError, ValueError):
+        mtime = 0
+    hash_cache = get_hash_cache()
+    if hash_cache:
+        try:
+            cached = hash_cache.get(url, file_size, mtime)
+            if cached:
+                return cached
+        except sqlite3.Error as e:
+            log(__name__, f"Hash cache lookup failed: {e}")
+
+    started = time()
+    # range requests go straight to where HEAD was redirected
+    head = _get_io_pool().submit(_read_http_range, r.url, headers, 0)
+    tail = _get_io_pool().submit(_read_http_range, r.url, headers, file_size - HASH_CHUNK_SIZE)
+    head_chunk, tail_chunk = head.result(), tail.result()
+    log(__name__, f"Read {url} ranges in {(time() - started) * 1000:.1f} ms")
+    if head_chunk is None or tail_chunk is None:
+        return None
+
+    result = file_size, "%016x" % sum_longs(head_chunk + tail_chunk, file_size)
+    if hash_cache:
+        try:
+            hash_cache.set(url, file_size, mtime, *result)
+        except sqlite3.Error as e:
+            log(__name__, f"Hash cache save failed: {e}")
+    return result
+
+
+def _read_http_range(url, headers, start):
+    range_headers = {**headers, "Range": f"bytes={start}-{start + HASH_CHUNK_SIZE - 1}"}
+    r = _get_http_session().get(url, headers=range_headers, stream=True, timeout=HTTP_TIMEOUT)
+    with r:
+        r.raise_for_status()
+        # a 200 means the range was ignored and the whole stream is coming, don't read it
+        if r.status_code != 206:
+            log(__name__, f"{url} did not honour range request, status {r.status_code}")
+            return None
+        chunk = r.content
+    return chunk if len(chunk) == HASH_CHUNK_SIZE else None
+
+
+_http_session = None
+
+
+def _get_http_session():
+    global _http_session
+    if _http_session is None:
+        from requests import Session
+        _http_session = Session()
+    return _http_session
+
+
+def sum_longs(buffer, hash_=0):
+    """Add every little-endian 64-bit word of buffer to hash_, modulo 2**64.
+
+    The whole buffer is decoded in one pass: a zero-copy memoryview cast where the
+    platform is little-endian, a single multi-item struct.unpack otherwise. Both give
+    the same result as summing the words one by one."""
+    count = len(buffer) // LONG_LONG_SIZE
+    buffer = memoryview(buffer)[:count * LONG_LONG_SIZE]
+    if sys.byteorder == "little":
+        try:
+            values = buffer.cast("B").cast("q")
+        except (TypeError, ValueError):
+            values = struct.unpack(f"<{count}q", buffer)
+    else:
+        values = struct.unpack(f"<{count}q", buffer)
+    return (hash_ + sum(values)) & 0xFFFFFFFFFFFFFFFF
 
 def hash_rar(first_rar_file):
     log(__name__, "Hash Rar file")
-    f = xbmcvfs.File(first_rar_file)
-    a = f.readBytes(4)
-    log(__name__, "Hash Rar a: %s" % a)
-    # Ensure comparison is done with a byte string
-    if a != b"Rar!":
-        raise Exception("ERROR: This is not rar file.")
-    
+    # one read covers the headers and, in most archives, the first 64 KiB of the packed file
+    with xbmcvfs.File(first_rar_file) as f:
+        buffer = bytes(f.readBytes(RAR_HEADER_SIZE + HASH_CHUNK_SIZE))
+        body_start, volume_body_size, unpack_size = parse_rar_header(buffer)
+
+        head = buffer[body_start:body_start + HASH_CHUNK_SIZE]
+        if len(head) < HASH_CHUNK_SIZE:
+            f.seek(body_start, 0)
+            head = read_hash_chunk(f, first_rar_file)
+        hash_ = sum_longs(head, unpack_size)
+
+        # volumes are assumed to carry about the same amount of packed data, as rar creates them
+        last_volume = (unpack_size - 1) // volume_body_size
+        if last_volume == 0:
+            f.seek(max(0, body_start + unpack_size - HASH_CHUNK_SIZE), 0)
+            hash_ = sum_longs(read_hash_chunk(f, first_rar_file), hash_)
+        f.close()
+
+    if last_volume > 0:
+        hash_ = add_volume_hash(get_last_split(first_rar_file, last_volume), hash_)
+    return unpack_size, "%016x" % hash_
+
+
+def parse_rar_header(header):
+    """Finds the first file block in the headers of a RAR4 or RAR5 volume.
+
+    Returns (body_start, volume_body_size, unpack_size): where the packed file starts in
+    the volume, how much of it each volume holds and its total unpacked size."""
+    if header[:len(RAR5_SIGNATURE)] == RAR5_SIGNATURE:
+        return _parse_rar5_header(header)
+    if header[:4] == b"Rar!":
+        return _parse_rar4_header(header)
+    raise Exception("ERROR: This is not rar file.")
+
+
+def _parse_rar4_header(header):
     seek = 0
-    for i in range(4):
-        f.seek(max(0, seek), 0)
-        a = f.readBytes(100)
-        type_, flag, size = struct.unpack("<BHH", a[2:2 + 5])
-        
+    while seek + 7 <= len(header):
+        block = header[seek:seek + 100]
+        type_, flag, size = struct.unpack("<BHH", block[2:2 + 5])
+
         if 0x74 == type_:
-            if 0x30 != struct.unpack("<B", a[25:25 + 1])[0]:
+            if 0x30 != block[25]:
                 raise Exception("Bad compression method! Work only for 'store'.")
-            
-            s_divide_body_start = seek + size
-            s_divide_body, s_unpack_size = struct.unpack("<II", a[7:7 + 2 * 4])
-            
+
+            s_divide_body, s_unpack_size = struct.unpack("<II", block[7:7 + 2 * 4])
+
             if flag & 0x0100:
-                s_unpack_size = (struct.unpack("<I", a[36:36 + 4])[0] << 32) + s_unpack_size
+                s_unpack_size = (struct.unpack("<I", block[36:36 + 4])[0] << 32) + s_unpack_size
                 log(__name__, "Hash untested for files bigger that 2gb. May work or may generate bad hash.")
-            
-            last_rar_file = get_last_split(first_rar_file, (s_unpack_size - 1) / s_divide_body)
-            hash_ = add_file_hash(first_rar_file, s_unpack_size, s_divide_body_start)
-            hash_ = add_file_hash(last_rar_file, hash_, (s_unpack_size % s_divide_body) + s_divide_body_start - 65536)
-            f.close()
-            return s_unpack_size, "%016x" % hash_
-        
+
+            return seek + size, s_divide_body, s_unpack_size
+
+        # blocks with the LONG_BLOCK flag are followed by ADD_SIZE bytes of data
+        if flag & 0x8000 and len(block) >= 11:
+            size += struct.unpack("<I", block[7:7 + 4])[0]
+        if not size:
+            break
         seek += size
-    
+
     raise Exception("ERROR: Not Body part in rar file.")
 
-def hash_rar_orig(first_rar_file):
-    log(__name__, "Hash Rar file")
-    f = xbmcvfs.File(first_rar_file)
-    a = f.readBytes(4)
-    if a != "Rar!":
-        raise Exception("ERROR: This is not rar file.")
-    seek = 0
-    for i in range(4):
-        f.seek(max(0, seek), 0)
-        a = f.readBytes(100)
-        type_, flag, size = struct.unpack("<BHH", a[2:2 + 5])
-        if 0x74 == type_:
-            if 0x30 != struct.unpack("<B", a[25:25 + 1])[0]:
-                raise Exception("Bad compression method! Work only for 'store'.")
-            s_divide_body_start = seek + size
-            s_divide_body, s_unpack_size = struct.unpack("<II", a[7:7 + 2 * 4])
-            if flag & 0x0100:
-                s_unpack_size = (struct.unpack("<I", a[36:36 + 4])[0] << 32) + s_unpack_size
-                log(__name__, "Hash untested for files bigger that 2gb. May work or may generate bad hash.")
-            last_rar_file = get_last_split(first_rar_file, (s_unpack_size - 1) / s_divide_body)
-            hash_ = add_file_hash(first_rar_file, s_unpack_size, s_divide_body_start)
-            hash_ = add_file_hash(last_rar_file, hash_, (s_unpack_size % s_divide_body) + s_divide_body_start - 65536)
-            f.close()
-            return s_unpack_size, "%016x" % hash_
-        seek += size
+
+def _read_vint(buffer, pos):
+    """Decodes a RAR5 variable length integer, returns (value, position after it)."""
+    value = shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value, pos
+        shift += 7
+
+
+def _parse_rar5_header(header):
+    pos = len(RAR5_SIGNATURE)
+    try:
+        while pos < len(header):
+            # every block starts with a CRC32 of its header
+            header_size, header_start = _read_vint(header, pos + 4)
+            header_type, pos = _read_vint(header, header_start)
+            header_flags, pos = _read_vint(header, pos)
+            data_size = 0
+            if header_flags & 0x0001:
+                _, pos = _read_vint(header, pos)
+            if header_flags & 0x0002:
+                data_size, pos = _read_vint(header, pos)
+
+            if header_type == 4:
+                raise Exception("Encrypted rar archives are not supported.")
+            if header_type == 2:
+                file_flags, pos = _read_vint(header, pos)
+                unpack_size, pos = _read_vint(header, pos)
+                # directories have no body, unknown sizes can't be hashed
+                if not file_flags & 0x0009:
+                    _, pos = _read_vint(header, pos)  # attributes
+                    if file_flags & 0x0002:
+                        pos += 4  # mtime
+                    if file_flags & 0x0004:
+                        pos += 4  # data CRC32
+                    compression_info, pos = _read_vint(header, pos)
+                    if (compression_info >> 7) & 0x07:
+                        raise Exception("Bad compression method! Work only for 'store'.")
+                    return header_start + header_size, data_size, unpack_size
+
+            pos = header_start + header_size + data_size
+    except IndexError:
+        pass
+
     raise Exception("ERROR: Not Body part in rar file.")
 
 
 def get_last_split(first_rar_file, x):
+    if x == 0:
+        return first_rar_file
     if first_rar_file[-3:] == "001":
         return first_rar_file[:-3] + ("%03d" % (x + 1))
     if first_rar_file[-11:-6] == ".part":
@@ -156,11 +445,19 @@ def get_last_split(first_rar_file, x):
     return first_rar_file[0:-2] + ("%02d" % (x - 1))
 
 
-def add_file_hash(name, hash_, seek):
-    f = xbmcvfs.File(name)
-    f.seek(max(0, seek), 0)
-    for i in range(8192):
-        hash_ += struct.unpack("<q", f.readBytes(8))[0]
-        hash_ = hash_ & 0xffffffffffffffff
-    f.close()
-    return hash_
+def add_volume_hash(name, hash_):
+    """Adds the last 64 KiB of the packed file in the last volume name to hash_.
+
+    The headers of later volumes can be longer than those of the first one, RAR5 adds a volume
+    number to them, so the packed data is located from the volume's own headers."""
+    with xbmcvfs.File(name) as f:
+        buffer = bytes(f.readBytes(RAR_HEADER_SIZE + HASH_CHUNK_SIZE))
+        body_start, volume_body_size, _ = parse_rar_header(buffer)
+
+        seek = max(0, body_start + volume_body_size - HASH_CHUNK_SIZE)
+        tail = buffer[seek:seek + HASH_CHUNK_SIZE]
+        if len(tail) < HASH_CHUNK_SIZE:
+            f.seek(seek, 0)
+            tail = read_hash_chunk(f, name)
+        f.close()
+    return sum_longs(tail, hash_)
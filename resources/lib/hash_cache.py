@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+
+from time import time
+
+from resources.lib import metrics
+from resources.lib.storage import open_database
+from resources.lib.utilities import log
+
+HASH_DATABASE = "hashes.db"
+HASH_CACHE_MAX_ENTRIES = 50000
+
+
+class HashCache(object):
+    """Persists OSDb hashes keyed by media path, validated by the file size and mtime.
+
+    Least recently used entries are evicted once max_entries is exceeded."""
+
+    def __init__(self, max_entries=HASH_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._db = open_database(HASH_DATABASE)
+        self._db.execute("CREATE TABLE IF NOT EXISTS hashes ("
+                         "path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+                         "file_size INTEGER, moviehash TEXT, last_used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)")
+
+    def get(self, path, size, mtime):
+        """Returns (file_size, moviehash) if path is cached with the same size and mtime, else None."""
+        with self._lock, metrics.timed("cache.hash.get"):
+            row = self._db.execute("SELECT file_size, moviehash FROM hashes WHERE path=? AND size=? AND mtime=?",
+                                   (path, size, mtime)).fetchone()
+            if row:
+                self._db.execute("UPDATE hashes SET last_used=? WHERE path=?", (time(), path))
+        if row:
+            metrics.increment("cache.hash.hits")
+            log(__name__, f"got hash for {path} from cache")
+            return row[0], row[1]
+        metrics.increment("cache.hash.misses")
+        return None
+
+    def set(self, path, size, mtime, file_size, moviehash):
+        log(__name__, f"caching hash for {path}")
+        with self._lock, metrics.timed("cache.hash.set"):
+            self._db.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)",
+                             (path, size, mtime, file_size, moviehash, time()))
+            self._evict()
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()
+        if count > self.max_entries:
+            self._db.execute("DELETE FROM hashes WHERE path IN "
+                             "(SELECT path FROM hashes ORDER BY last_used LIMIT ?)", (count - self.max_entries,))
+            metrics.increment("cache.hash.evictions", count - self.max_entries)
+            log(__name__, f"evicted {count - self.max_entries} hashes")
+
+    def stats(self):
+        """Returns the number of cached hashes and the size of the database holding them."""
+        with self._lock:
+            (entries,) = self._db.execute("SELECT COUNT(*) FROM hashes").fetchone()
+            (page_count,) = self._db.execute("PRAGMA page_count").fetchone()
+            (page_size,) = self._db.execute("PRAGMA page_size").fetchone()
+        return {"entries": entries, "bytes": page_count * page_size}
+
+
+_hash_cache = None
+
+
+def get_hash_cache():
+    """Returns the shared HashCache, or None if the profile database can't be opened."""
+    global _hash_cache
+    if _hash_cache is None:
+        try:
+            _hash_cache = HashCache()
+        except sqlite3.Error as e:
+            log(__name__, f"hash cache unavailable: {e}")
+    return _hash_cache
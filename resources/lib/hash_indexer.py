@@ -0,0 +1,167 @@
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from urllib.parse import urlparse
+
+from resources.lib.data_collector import _jsonrpc
+from resources.lib.file_operations import HASH_CHUNK_SIZE, get_stack_parts, hash_file, stat_file
+from resources.lib.hash_cache import get_hash_cache
+from resources.lib.utilities import log
+
+# paths the indexer can't or shouldn't read through the VFS
+SKIPPED_SCHEMES = ("http://", "https://", "plugin://", "pvr://", "rar://", "zip://", "archive://", "upnp://")
+LIBRARY_PAGE_SIZE = 500
+INDEXER_WORKERS = 4
+# spinning disks seek badly under parallel reads, one hash at a time per device
+DEVICE_CONCURRENCY = 1
+
+
+def get_device(file_path):
+    """Groups paths that share a disk: the server of network paths, the mount point (/mnt/disk1) or drive of local ones."""
+    parsed = urlparse(file_path)
+    if parsed.netloc:
+        return f"{parsed.scheme}://{parsed.netloc}"
+    parts = file_path.replace("\\", "/").split("/")
+    # C:/movies/... splits into a drive first, /mnt/disk1/... into an empty root
+    return parts[0] if parts[0] else "/".join(parts[:3])
+
+
+class RateLimiter(object):
+    """Token bucket limiting bytes read per second, waits through the Kodi monitor so it aborts cleanly."""
+
+    def __init__(self, monitor, rate):
+        self.monitor = monitor
+        self._lock = threading.Lock()
+        self.rate = None
+        self._allowance = max(rate, 0)
+        self._last = time()
+        self.set_rate(rate)
+
+    def set_rate(self, rate):
+        with self._lock:
+            # a zero or negative setting would divide by zero below, treat it as no limit
+            self.rate = rate if rate > 0 else None
+            self._allowance = min(self._allowance, self.rate or 0)
+
+    def acquire(self, size):
+        """Blocks until size bytes may be read, returns False if Kodi is shutting down."""
+        while True:
+            with self._lock:
+                if self.rate is None:
+                    return not self.monitor.abortRequested()
+                # the bucket holds at least one request, or requests larger than a second's rate never fit
+                capacity = max(self.rate, size)
+                now = time()
+                self._allowance = min(capacity, self._allowance + (now - self._last) * self.rate)
+                self._last = now
+                if self._allowance >= size:
+                    self._allowance -= size
+                    return True
+                wait = (size - self._allowance) / self.rate
+            if self.monitor.waitForAbort(wait):
+                return False
+
+
+class LibraryHashIndexer(object):
+    """Hashes the files of the video library into the hash cache in the background.
+
+    Files already cached with the same size and mtime are skipped, so later runs only hash what changed."""
+
+    def __init__(self, monitor, player, rate, enabled=True):
+        self.monitor = monitor
+        self.player = player
+        self.enabled = enabled
+        self.rate_limiter = RateLimiter(monitor, rate)
+        self._device_locks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = False
+
+    def configure(self, enabled, rate):
+        """Applies changed settings, a run in progress stops hashing when the indexer is disabled."""
+        self.enabled = enabled
+        self.rate_limiter.set_rate(rate)
+
+    def start(self):
+        """Starts an indexing run, or queues one more if a run is in progress."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                self._pending = True
+                return
+            self._thread = threading.Thread(target=self._run, name="hash_indexer")
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.index_library()
+            with self._lock:
+                if not self._pending or self.monitor.abortRequested():
+                    return
+                self._pending = False
+
+    def index_library(self):
+        hash_cache = get_hash_cache()
+        if not hash_cache:
+            return
+        started = time()
+        files = self.get_library_files()
+        log(__name__, f"indexing {len(files)} library files")
+        with ThreadPoolExecutor(max_workers=INDEXER_WORKERS, thread_name_prefix="hash_indexer") as pool:
+            hashed = sum(pool.map(lambda file_path: self.index_file(hash_cache, file_path), files))
+        log(__name__, f"indexed library in {time() - started:.1f} s, {hashed} new hashes")
+
+    def get_library_files(self):
+        files = []
+        for method, key in (("VideoLibrary.GetMovies", "movies"), ("VideoLibrary.GetEpisodes", "episodes")):
+            start = 0
+            while not self.monitor.abortRequested():
+                result = _jsonrpc(method, {"properties": ["file"],
+                                           "limits": {"start": start, "end": start + LIBRARY_PAGE_SIZE}},
+                                  use_cache=False)
+                items = (result or {}).get(key) or []
+                for video in items:
+                    file_path = video.get("file") or ""
+                    if file_path.startswith("stack://"):
+                        files.extend(get_stack_parts(file_path))
+                    elif file_path:
+                        files.append(file_path)
+                if len(items) < LIBRARY_PAGE_SIZE:
+                    break
+                start += LIBRARY_PAGE_SIZE
+        # dict keeps library order while dropping files listed twice
+        return [file_path for file_path in dict.fromkeys(files) if not file_path.lower().startswith(SKIPPED_SCHEMES)]
+
+    def index_file(self, hash_cache, file_path):
+        """Hashes file_path unless it's cached already, returns whether a new hash was stored."""
+        if not self.enabled or not self.wait_while_playing():
+            return False
+
+        device = get_device(file_path)
+        with self._lock:
+            device_lock = self._device_locks.setdefault(device, threading.BoundedSemaphore(DEVICE_CONCURRENCY))
+
+        with device_lock:
+            try:
+                size, mtime = stat_file(file_path)
+                if not size or hash_cache.get(file_path, size, mtime):
+                    return False
+                if not self.rate_limiter.acquire(HASH_CHUNK_SIZE * 2):
+                    return False
+                result = hash_file(file_path, False)
+                if result == "SizeError":
+                    return False
+                hash_cache.set(file_path, size, mtime, *result)
+                return True
+            except Exception as e:
+                log(__name__, f"Failed to index {file_path}: {e}")
+                return False
+
+    def wait_while_playing(self):
+        """Holds the indexer back while something plays, returns False if Kodi is shutting down."""
+        while self.player.isPlaying():
+            if self.monitor.waitForAbort(10):
+                return False
+        return not self.monitor.abortRequested()
@@ -0,0 +1,196 @@
+import json
+import sqlite3
+import threading
+
+from time import time
+
+from resources.lib.data_collector import _jsonrpc
+from resources.lib.matcher import normalize_title
+from resources.lib.storage import open_database
+from resources.lib.utilities import log
+
+LIBRARY_DATABASE = "library.db"
+PAGE_SIZE = 500
+# items a lookup without an index reads, it runs inline in the plugin
+LOOKUP_LIMIT = 50
+# a full rebuild catches changes made without notifications, e.g. by other clients of a shared database
+REBUILD_INTERVAL = 60 * 60 * 24
+MOVIE_PROPERTIES = ["imdbnumber", "uniqueid", "title", "originaltitle", "year", "file"]
+TVSHOW_PROPERTIES = ["imdbnumber", "uniqueid", "title", "originaltitle", "year", "episodeguide"]
+# kind -> (list method, details method, list key, details key, id key, properties)
+LIBRARY_KINDS = {
+    "movie": ("VideoLibrary.GetMovies", "VideoLibrary.GetMovieDetails", "movies", "moviedetails", "movieid",
+              MOVIE_PROPERTIES),
+    "tvshow": ("VideoLibrary.GetTVShows", "VideoLibrary.GetTVShowDetails", "tvshows", "tvshowdetails", "tvshowid",
+               TVSHOW_PROPERTIES),
+}
+# words too common to narrow down the candidates of a title search
+STOPWORDS = {"a", "an", "and", "of", "the"}
+
+
+class LibraryIndex(object):
+    """Persists the movies and TV shows of the Kodi library, indexed by normalized title and title word.
+
+    The index is built once from the full library and then kept up to date from the library
+    notifications the background service receives."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db = open_database(LIBRARY_DATABASE)
+        self._db.execute("CREATE TABLE IF NOT EXISTS items (kind TEXT, dbid INTEGER, item TEXT, "
+                         "PRIMARY KEY (kind, dbid))")
+        self._db.execute("CREATE TABLE IF NOT EXISTS titles (kind TEXT, title TEXT, dbid INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS titles_title ON titles (kind, title)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS titles_dbid ON titles (kind, dbid)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS tokens (kind TEXT, token TEXT, dbid INTEGER)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tokens_token ON tokens (kind, token)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS tokens_dbid ON tokens (kind, dbid)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+
+    def is_built(self):
+        return self._get_built_time() is not None
+
+    def is_current(self):
+        built = self._get_built_time()
+        return built is not None and time() - built < REBUILD_INTERVAL
+
+    def rebuild(self):
+        """Replaces the index with the whole library, read page by page."""
+        started = time()
+        items = {kind: self._get_all(kind) for kind in LIBRARY_KINDS}
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for table in ("items", "titles", "tokens"):
+                    self._db.execute(f"DELETE FROM {table}")
+                for kind, kind_items in items.items():
+                    for item in kind_items:
+                        self._insert(kind, item)
+                self._db.execute("INSERT OR REPLACE INTO meta VALUES ('built', ?)", (time(),))
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        log(__name__, f"indexed {sum(len(kind_items) for kind_items in items.values())} library items "
+                      f"in {time() - started:.2f}s")
+
+    def update(self, kind, dbid):
+        """Re-reads a single library item, after Kodi added or changed it."""
+        if kind not in LIBRARY_KINDS:
+            return
+        _, details_method, _, details_key, id_key, properties = LIBRARY_KINDS[kind]
+        result = _jsonrpc(details_method, {id_key: dbid, "properties": properties}, use_cache=False)
+        if not result or details_key not in result:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete(kind, dbid)
+                self._insert(kind, result[details_key])
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        log(__name__, f"updated {kind} {dbid} in library index")
+
+    def remove(self, kind, dbid):
+        if kind not in LIBRARY_KINDS:
+            return
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete(kind, dbid)
+                self._db.execute("COMMIT")
+            except sqlite3.Error:
+                self._db.execute("ROLLBACK")
+                raise
+        log(__name__, f"removed {kind} {dbid} from library index")
+
+    def find(self, kind, title):
+        """Returns the library items of kind whose title or original title matches title.
+
+        Exact matches of the normalized title win, otherwise items are matched when one title
+        contains the other, like the library scan this index replaces."""
+        search_title = normalize_title(title)
+        if not search_title:
+            return []
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT items.item FROM titles JOIN items USING (kind, dbid) "
+                                    "WHERE titles.kind=? AND titles.title=?", (kind, search_title)).fetchall()
+            if rows:
+                return [json.loads(row[0]) for row in rows]
+
+            words = set(search_title.split())
+            words = words - STOPWORDS or words
+            rows = self._db.execute("SELECT DISTINCT items.item FROM tokens JOIN items USING (kind, dbid) "
+                                    f"WHERE tokens.kind=? AND tokens.token IN ({','.join('?' * len(words))})",
+                                    (kind, *words)).fetchall()
+        matches = []
+        for row in rows:
+            item = json.loads(row[0])
+            for item_title in self._get_titles(item):
+                if search_title in item_title or item_title in search_title:
+                    matches.append(item)
+                    break
+        return matches
+
+    def _get_all(self, kind):
+        list_method, _, list_key, _, _, properties = LIBRARY_KINDS[kind]
+        items = []
+        start = 0
+        while True:
+            result = _jsonrpc(list_method, {"properties": properties,
+                                            "limits": {"start": start, "end": start + PAGE_SIZE}}, use_cache=False)
+            page = (result or {}).get(list_key) or []
+            items.extend(page)
+            start += PAGE_SIZE
+            if len(page) < PAGE_SIZE or start >= ((result or {}).get("limits") or {}).get("total", 0):
+                return items
+
+    def _get_built_time(self):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key='built'").fetchone()
+        return row[0] if row else None
+
+    @staticmethod
+    def _get_titles(item):
+        return {normalize_title(item.get(key)) for key in ("title", "originaltitle")} - {""}
+
+    def _insert(self, kind, item):
+        dbid = item[LIBRARY_KINDS[kind][4]]
+        titles = self._get_titles(item)
+        self._db.execute("INSERT OR REPLACE INTO items VALUES (?, ?, ?)", (kind, dbid, json.dumps(item)))
+        self._db.executemany("INSERT INTO titles VALUES (?, ?, ?)", [(kind, title, dbid) for title in titles])
+        tokens = {token for title in titles for token in title.split()}
+        self._db.executemany("INSERT INTO tokens VALUES (?, ?, ?)", [(kind, token, dbid) for token in tokens])
+
+    def _delete(self, kind, dbid):
+        for table in ("items", "titles", "tokens"):
+            self._db.execute(f"DELETE FROM {table} WHERE kind=? AND dbid=?", (kind, dbid))
+
+
+def lookup_library(kind, title):
+    """Returns up to LOOKUP_LIMIT library items of kind whose title contains title, read over JSON-RPC.
+
+    Used while the library index hasn't been built yet, instead of reading the whole library."""
+    if kind not in LIBRARY_KINDS or not title:
+        return []
+    list_method, _, list_key, _, _, properties = LIBRARY_KINDS[kind]
+    result = _jsonrpc(list_method, {"properties": properties,
+                                    "filter": {"field": "title", "operator": "contains", "value": title},
+                                    "limits": {"end": LOOKUP_LIMIT}}, use_cache=False)
+    return (result or {}).get(list_key) or []
+
+
+_library_index = None
+
+
+def get_library_index():
+    """Returns the shared LibraryIndex, or None if the profile database can't be opened."""
+    global _library_index
+    if _library_index is None:
+        try:
+            _library_index = LibraryIndex()
+        except sqlite3.Error as e:
+            log(__name__, f"library index unavailable: {e}")
+    return _library_index
@@ -0,0 +1,106 @@
+import atexit
+import sqlite3
+import threading
+
+from contextlib import contextmanager
+from time import time
+
+from resources.lib.storage import open_database
+from resources.lib.utilities import log
+
+METRICS_DATABASE = "metrics.db"
+
+_db = None
+_lock = threading.Lock()
+# collected in memory and merged into the database by flush: counters add up, maxima keep the
+# largest value seen by any invocation, gauges keep the last value
+_counters = {}
+_maxima = {}
+_gauges = {}
+
+
+def _get_database():
+    global _db
+    if _db is None:
+        try:
+            db = open_database(METRICS_DATABASE)
+            db.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value REAL)")
+            _db = db
+        except sqlite3.Error as e:
+            log(__name__, f"metrics unavailable: {e}")
+    return _db
+
+
+def increment(name, amount=1):
+    """Adds amount to the persistent counter name, shared by all invocations of the add-on."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def set_gauge(name, value):
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name, seconds):
+    """Records a latency sample as name.count, name.total_ms and name.max_ms."""
+    ms = seconds * 1000
+    with _lock:
+        _counters[f"{name}.count"] = _counters.get(f"{name}.count", 0) + 1
+        _counters[f"{name}.total_ms"] = _counters.get(f"{name}.total_ms", 0) + ms
+        _maxima[f"{name}.max_ms"] = max(_maxima.get(f"{name}.max_ms", 0), ms)
+
+
+@contextmanager
+def timed(name):
+    started = time()
+    try:
+        yield
+    finally:
+        observe(name, time() - started)
+
+
+def flush():
+    """Merges the metrics collected by this process into the metrics database."""
+    global _counters, _maxima, _gauges
+    with _lock:
+        if not (_counters or _maxima or _gauges):
+            return
+        db = _get_database()
+        if db is None:
+            return
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            names = [(name,) for name in list(_counters) + list(_maxima) + list(_gauges)]
+            db.executemany("INSERT OR IGNORE INTO counters VALUES (?, 0)", names)
+            db.executemany("UPDATE counters SET value=value+? WHERE name=?",
+                           [(value, name) for name, value in _counters.items()])
+            db.executemany("UPDATE counters SET value=MAX(value, ?) WHERE name=?",
+                           [(value, name) for name, value in _maxima.items()])
+            db.executemany("UPDATE counters SET value=? WHERE name=?",
+                           [(value, name) for name, value in _gauges.items()])
+            db.execute("COMMIT")
+            _counters, _maxima, _gauges = {}, {}, {}
+        except sqlite3.Error as e:
+            log(__name__, f"failed to flush metrics: {e}")
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+
+
+def get_counters(prefix=""):
+    """Returns {name: value} of the metrics starting with prefix, including unflushed ones."""
+    flush()
+    with _lock:
+        db = _get_database()
+        if db is None:
+            return {}
+        try:
+            rows = db.execute("SELECT name, value FROM counters WHERE name LIKE ? ORDER BY name",
+                              (prefix + "%",)).fetchall()
+        except sqlite3.Error as e:
+            log(__name__, f"failed to read counters: {e}")
+            return {}
+    return {name: int(value) if value == int(value) else round(value, 3) for name, value in rows}
+
+
+atexit.register(flush)
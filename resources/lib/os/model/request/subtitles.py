@@ -1,4 +1,6 @@
 
+import re
+
 from datetime import date
 
 from resources.lib.os.model.request.abstract import OpenSubtitlesRequest
@@ -16,6 +18,37 @@ LANGUAGE_LIST = ["af", "sq", "ar", "an", "hy", "at", "eu", "be", "bn", "bs", "br
                  "it", "ja", "kk", "km", "ko", "lv", "lt", "lb", "mk", "ml", "ms", "ma", "mn", "no", "oc", "fa", "pl",
                  "pt-pt", "ru", "sr", "si", "sk", "sl", "es", "sw", "sv", "sy", "ta", "te", "tl", "th", "tr", "uk",
                  "ur", "uz", "vi", "ro", "pt-br", "me", "zh-tw", "ze", "se"]
+NUMERIC_PARAM_LIST = ["episode_number", "id", "imdb_id", "page", "parent_feature_id", "parent_imdb_id",
+                      "parent_tmdb_id", "season_number", "tmdb_id", "user_id", "year"]
+# any of these identifies the feature, a title query next to them only splits the cache
+ID_PARAM_LIST = ["id", "imdb_id", "parent_feature_id", "parent_imdb_id", "parent_tmdb_id", "tmdb_id"]
+
+
+def canonicalize_params(params):
+    """Normalizes search params, so equivalent searches build the same request and cache key.
+
+    Languages are lowercased, deduplicated and sorted, the query is lowercased with whitespace
+    collapsed, numeric strings become ints and the query is dropped when an ID is given."""
+    canonical = {}
+    for key, value in params.items():
+        if key == "languages":
+            languages = value.split(",") if isinstance(value, str) else value
+            value = ",".join(sorted({lang.strip().lower() for lang in languages if lang.strip()}))
+        elif key == "query":
+            value = re.sub(r"\s+", " ", str(value)).strip().lower()
+        elif key == "moviehash":
+            value = str(value).lower()
+        elif key in NUMERIC_PARAM_LIST and str(value).strip().isdigit():
+            value = int(value)
+        elif isinstance(value, str):
+            value = value.strip().lower()
+        if value or value == 0:
+            canonical[key] = value
+
+    if any(canonical.get(key) for key in ID_PARAM_LIST):
+        canonical.pop("query", None)
+
+    return canonical
 
 
 class OpenSubtitlesSubtitlesRequest(OpenSubtitlesRequest):
@@ -59,6 +92,9 @@ class OpenSubtitlesSubtitlesRequest(OpenSubtitlesRequest):
                                  parent_tmdb_id=None, query="", season_number=None, tmdb_id=None,
                                  trusted_sources="include", type="all", user_id=None, year=None)
 
+    def request_params(self):
+        return canonicalize_params(super().request_params())
+
     @property
     def id(self):
         return self._id
@@ -2,11 +2,13 @@
 from typing import Union
 import json
 import hashlib
+import threading
 
 from requests import Session, ConnectionError, HTTPError, ReadTimeout, Timeout, RequestException
 
 from resources.lib.os.model.request.subtitles import OpenSubtitlesSubtitlesRequest
 from resources.lib.os.model.request.download import OpenSubtitlesDownloadRequest
+from resources.lib.os.token_manager import TokenManager
 
 '''local kodi module imports. replace by any other exception, cache, log provider'''
 from resources.lib.exceptions import AuthenticationError, ConfigurationError, DownloadLimitExceeded, ProviderError, \
@@ -23,6 +25,16 @@ API_DOWNLOAD = "download"
 CONTENT_TYPE = "application/json"
 REQUEST_TIMEOUT = 30
 
+# subtitle fields used to list and download results, everything else in the API response is dropped
+SUBTITLE_ATTRIBUTES = ("language", "release", "ratings", "votes", "download_count", "from_trusted",
+                       "hearing_impaired", "moviehash_match")
+FEATURE_DETAILS = ("title", "movie_name")
+FILE_ATTRIBUTES = ("file_id", "cd_number")
+
+# search cache keys being refreshed by this process
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
 class_lookup = {"OpenSubtitlesSubtitlesRequest": OpenSubtitlesSubtitlesRequest,
                 "OpenSubtitlesDownloadRequest": OpenSubtitlesDownloadRequest}
 
@@ -34,6 +46,19 @@ def logging(msg):
     return log(__name__, msg)
 
 
+def project_subtitles(data):
+    """Strips search results down to the fields listing and downloading use, keeping their layout."""
+    subtitles = []
+    for subtitle in data:
+        attributes = subtitle.get("attributes", {})
+        feature_details = attributes.get("feature_details") or {}
+        projected = {key: attributes.get(key) for key in SUBTITLE_ATTRIBUTES}
+        projected["feature_details"] = {key: feature_details.get(key) for key in FEATURE_DETAILS}
+        projected["files"] = [{key: file.get(key) for key in FILE_ATTRIBUTES} for file in attributes.get("files", [])]
+        subtitles.append({"id": subtitle.get("id"), "attributes": projected})
+    return subtitles
+
+
 def query_to_params(query, _type):
     logging("type: ")
     logging(type(query))
@@ -81,9 +106,11 @@ class OpenSubtitlesProvider:
         self.session.headers = self.request_headers
 
         # Use any other cache outside of module/Kodi
-        self.cache = Cache(key_prefix="os_com")
+        self.cache = Cache(key_prefix="os_com", name="token")
+        self.search_cache = Cache(key_prefix="os_com_search", name="search")
+        self.tokens = TokenManager(self.cache, self.login)
 
-    # make login request. Sets auth token
+    # make login request. Returns auth token
     def login(self):
 
         # build login request
@@ -135,19 +162,16 @@ class OpenSubtitlesProvider:
             try:
                 response_json = r.json()
                 logging(f"Login successful response JSON: {response_json}")
-                self.user_token = response_json["token"]
+                user_token = response_json["token"]
                 logging(f"Token extracted successfully")
             except ValueError as e:
                 logging(f"Failed to parse login response JSON: {e}")
                 raise ValueError("Invalid JSON returned by provider")
+            return user_token
 
     @property
     def user_token(self):
-        return self.cache.get(key="user_token")
-
-    @user_token.setter
-    def user_token(self, value):
-        self.cache.set(key="user_token", value=value)
+        return self.tokens.get()
 
     def search_subtitles(self, query: Union[dict, OpenSubtitlesSubtitlesRequest]):
 
@@ -171,6 +195,13 @@ class OpenSubtitlesProvider:
             logging(f"Error reading cache setting: {e}")
             cache_ttl = 0
 
+        # Expired entries younger than the grace window are served while being refreshed
+        try:
+            cache_grace = int(float(__addon__.getSetting("search_cache_grace") or 0)) * 60
+        except ValueError as e:
+            logging(f"Error reading cache grace setting: {e}")
+            cache_grace = 0
+
         # If user sets duration to 0, we disable caching
         use_cache = cache_ttl > 0
         # --- [END] Cache Config ---
@@ -179,18 +210,71 @@ class OpenSubtitlesProvider:
         cache_key = None
         if use_cache:
             try:
-                # Create unique key from params
+                # Create unique key from params, canonicalized by the request model
                 params_str = json.dumps(params, sort_keys=True)
                 cache_key = hashlib.md5(params_str.encode('utf-8')).hexdigest()
                 
-                cached_result = self.cache.get(cache_key)
+                cached_result, stale = self.search_cache.get_with_state(cache_key, allow_stale=cache_grace > 0)
+                if cached_result and stale:
+                    logging(f"CACHE STALE HIT: Returning stale subtitles for key {cache_key}, refreshing")
+                    self._refresh_search(params, cache_key, cache_ttl, cache_grace)
+                    return cached_result
                 if cached_result:
                     logging(f"CACHE HIT: Returning cached subtitles for key {cache_key} (TTL: {cache_ttl}s)")
                     return cached_result
+                logging(f"CACHE MISS: No cached subtitles for key {cache_key}")
             except Exception as e:
                 logging(f"Cache check failed: {e}")
         # --- [END] Cache Check ---
 
+        data = self._request_subtitles(params)
+
+        if len(data):
+            # --- [START] Cache Save (Added) ---
+            if use_cache and cache_key:
+                self._cache_search(cache_key, data, cache_ttl, cache_grace)
+            # --- [END] Cache Save ---
+
+            return data
+
+        return None
+
+    def _cache_search(self, cache_key, data, cache_ttl, cache_grace):
+        try:
+            logging(f"CACHE SAVE: Storing results for {cache_key} (expires in {cache_ttl}s, stale for {cache_grace}s)")
+            self.search_cache.set(cache_key, data, expires=cache_ttl, stale=cache_grace)
+        except Exception as e:
+            logging(f"Cache save failed: {e}")
+
+    def _refresh_search(self, params, cache_key, cache_ttl, cache_grace):
+        """Refreshes a stale search cache entry in a background thread, at most once at a time per key."""
+        with _refreshing_lock:
+            if cache_key in _refreshing:
+                return
+            _refreshing.add(cache_key)
+        # the lease keeps other plugin invocations from refreshing the same key meanwhile
+        if not self.search_cache.claim(f"refresh:{cache_key}", REQUEST_TIMEOUT * 2):
+            logging(f"Refresh of {cache_key} already running elsewhere")
+            with _refreshing_lock:
+                _refreshing.discard(cache_key)
+            return
+
+        def refresh():
+            try:
+                data = self._request_subtitles(params)
+                if len(data):
+                    self._cache_search(cache_key, data, cache_ttl, cache_grace)
+                logging(f"Refreshed stale search {cache_key}")
+            except Exception as e:
+                logging(f"Refresh of stale search {cache_key} failed: {e}")
+            finally:
+                self.search_cache.release(f"refresh:{cache_key}")
+                with _refreshing_lock:
+                    _refreshing.discard(cache_key)
+
+        threading.Thread(target=refresh, name="search_refresh").start()
+
+    def _request_subtitles(self, params):
         # Check if we have a user token for authentication
         current_token = self.user_token
         logging(f"Current user token: {current_token[:20] if current_token else None}...")
@@ -250,19 +334,7 @@ class OpenSubtitlesProvider:
         else:
             logging(f"Query returned {len(result['data'])} subtitles")
 
-        if len(result["data"]):
-            # --- [START] Cache Save (Added) ---
-            if use_cache and cache_key:
-                try:
-                    logging(f"CACHE SAVE: Storing results for {cache_key} (expires in {cache_ttl}s)")
-                    self.cache.set(cache_key, result["data"], expires=cache_ttl)
-                except Exception as e:
-                    logging(f"Cache save failed: {e}")
-            # --- [END] Cache Save ---
-
-            return result["data"]
-
-        return None
+        return project_subtitles(result["data"])
 
 #   def download_subtitle(self, query: Union[dict, OpenSubtitlesDownloadRequest]):
 #       if self.user_token is None:
@@ -282,17 +354,7 @@ class OpenSubtitlesProvider:
     def download_subtitle(self, query: Union[dict, OpenSubtitlesDownloadRequest]):
         if self.user_token is None and self.username and self.password:
             logging("No cached token, we'll try to login again.")
-            try:
-                self.login()
-            except AuthenticationError as e:
-                logging("Unable to authenticate.")
-                raise AuthenticationError("Unable to authenticate.")
-            except BadUsernameError as e:
-                logging("Bad username, email instead of useername.")
-                raise BadUsernameError("Bad username. Email instead of username. ")
-            except (ServiceUnavailable, TooManyRequests, ProviderError, ValueError) as e:
-                logging("Unable to obtain an authentication token.")
-                raise ProviderError(f"Unable to obtain an authentication token: {e}")
+            self._login_for_download()
         elif self.user_token is None:
             logging("No cached token, but username or password is missing. Proceeding with free downloads.")
         if self.user_token == "":
@@ -307,30 +369,39 @@ class OpenSubtitlesProvider:
 
         # build download request
         download_url = API_URL + API_DOWNLOAD
-        download_headers= {}
-        if not self.user_token==None:
-            download_headers = {"Authorization": "Bearer " + self.user_token}
-
         download_params = {"file_id": params["file_id"], "sub_format": "srt"}
 
-        try:
-            r = self.session.post(download_url, headers=download_headers, json=download_params, timeout=REQUEST_TIMEOUT)
-            logging(r.url)
-            r.raise_for_status()
-        except (ConnectionError, Timeout, ReadTimeout) as e:
-            raise ServiceUnavailable(f"Unknown Error, empty response: {e.status_code}: {e!r}")
-        except HTTPError as e:
-            status_code = e.response.status_code
-            if status_code == 401:
-                raise AuthenticationError(f"Login failed: {e.response.reason}")
-            elif status_code == 429:
-                raise TooManyRequests()
-            elif status_code == 406:
-                raise DownloadLimitExceeded(f"Daily download limit reached: {e.response.reason}")
-            elif status_code == 503:
-                raise ProviderError(e)
-            else:
-                raise ProviderError(f"Bad status code on download: {status_code}")
+        # a rejected token is dropped and the download retried once with a fresh one
+        for attempt in range(2):
+            user_token = self.user_token
+            download_headers= {}
+            if not user_token==None:
+                download_headers = {"Authorization": "Bearer " + user_token}
+
+            try:
+                r = self.session.post(download_url, headers=download_headers, json=download_params, timeout=REQUEST_TIMEOUT)
+                logging(r.url)
+                r.raise_for_status()
+            except (ConnectionError, Timeout, ReadTimeout) as e:
+                raise ServiceUnavailable(f"Unknown Error, empty response: {e.status_code}: {e!r}")
+            except HTTPError as e:
+                status_code = e.response.status_code
+                if status_code == 401 and attempt == 0 and user_token and self.username and self.password:
+                    logging("Token rejected, logging in again.")
+                    self.tokens.invalidate()
+                    self._login_for_download()
+                    continue
+                elif status_code == 401:
+                    raise AuthenticationError(f"Login failed: {e.response.reason}")
+                elif status_code == 429:
+                    raise TooManyRequests()
+                elif status_code == 406:
+                    raise DownloadLimitExceeded(f"Daily download limit reached: {e.response.reason}")
+                elif status_code == 503:
+                    raise ProviderError(e)
+                else:
+                    raise ProviderError(f"Bad status code on download: {status_code}")
+            break
 
         try:
             subtitle = r.json()
@@ -345,4 +416,17 @@ class OpenSubtitlesProvider:
             if not subtitle["content"]:
                 logging(f"Could not download subtitle from {subtitle.download_link}")
 
-        return subtitle
\ No newline at end of file
+        return subtitle
+
+    def _login_for_download(self):
+        try:
+            self.tokens.login()
+        except AuthenticationError as e:
+            logging("Unable to authenticate.")
+            raise AuthenticationError("Unable to authenticate.")
+        except BadUsernameError as e:
+            logging("Bad username, email instead of useername.")
+            raise BadUsernameError("Bad username. Email instead of username. ")
+        except (ServiceUnavailable, TooManyRequests, ProviderError, ValueError) as e:
+            logging("Unable to obtain an authentication token.")
+            raise ProviderError(f"Unable to obtain an authentication token: {e}")
\ No newline at end of file
@@ -0,0 +1,110 @@
+import base64
+import json
+import threading
+
+from time import sleep, time
+
+'''local kodi module imports. replace by any other log provider'''
+from resources.lib.exceptions import ProviderError
+from resources.lib.utilities import log
+
+TOKEN_KEY = "user_token"
+LOGIN_LEASE_KEY = "login"
+# lifetime assumed for tokens without a readable exp claim
+DEFAULT_TOKEN_LIFETIME = 60 * 60 * 24
+# tokens are renewed in the background once less than this is left of their lifetime
+REFRESH_AHEAD = 60 * 60
+# cached tokens are dropped this long before they expire, so a request never carries an expired one
+EXPIRY_MARGIN = 5 * 60
+# longest a login may hold the lease, other callers wait for it at most this long
+LOGIN_LEASE = 60
+LOGIN_POLL_INTERVAL = 0.5
+
+
+def logging(msg):
+    return log(__name__, msg)
+
+
+def get_token_expiry(token):
+    """Returns the exp claim of a JWT as a timestamp, or None if it can not be read."""
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return float(json.loads(base64.urlsafe_b64decode(payload))["exp"])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+class TokenManager(object):
+    """Keeps the API user token in the cache until shortly before it expires.
+
+    Logins are single-flight across threads and Kodi processes: whoever holds the login lease of the
+    cache logs in, everyone else waits for the token it stores."""
+
+    def __init__(self, cache, login):
+        self.cache = cache
+        # callable returning a new token, raising ProviderError or ValueError on failure
+        self._login = login
+        self._refreshing = False
+
+    def get(self):
+        """Returns the cached token or None, starting a background refresh if it expires soon."""
+        token = self.cache.get(TOKEN_KEY)
+        if token and not self._refreshing:
+            expiry = get_token_expiry(token)
+            if expiry and expiry - time() < REFRESH_AHEAD:
+                self.refresh_in_background()
+        return token
+
+    def store(self, token):
+        expiry = get_token_expiry(token) or time() + DEFAULT_TOKEN_LIFETIME
+        expires = expiry - time() - EXPIRY_MARGIN
+        if expires <= 0:
+            logging("Received an already expired token, not caching it")
+            return
+        logging(f"Caching token for {int(expires)}s")
+        self.cache.set(TOKEN_KEY, token, expires=expires)
+
+    def invalidate(self):
+        logging("Dropping cached token")
+        self.cache.delete(TOKEN_KEY)
+
+    def login(self):
+        """Logs in and returns the new token, or the one a concurrent login obtained meanwhile."""
+        claimed = self.cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE)
+        if not claimed:
+            logging("Login already in flight, waiting for its token")
+            deadline = time() + LOGIN_LEASE
+            while not claimed and time() < deadline:
+                sleep(LOGIN_POLL_INTERVAL)
+                token = self.cache.get(TOKEN_KEY)
+                if token:
+                    return token
+                # the other login failed without storing a token, take over
+                claimed = self.cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE)
+            if not claimed:
+                raise ProviderError("Timed out waiting for a login in progress")
+        try:
+            token = self._login()
+            self.store(token)
+            return token
+        finally:
+            self.cache.release(LOGIN_LEASE_KEY)
+
+    def refresh_in_background(self):
+        """Replaces the token ahead of its expiry, unless a login is already in flight anywhere."""
+        if not self.cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE):
+            return
+        self._refreshing = True
+
+        def refresh():
+            try:
+                self.store(self._login())
+                logging("Refreshed token ahead of expiry")
+            except (ProviderError, ValueError) as e:
+                logging(f"Token refresh failed, keeping the current one: {e}")
+            finally:
+                self.cache.release(LOGIN_LEASE_KEY)
+                self._refreshing = False
+
+        threading.Thread(target=refresh, name="token_refresh").start()
@@ -0,0 +1,66 @@
+import threading
+
+from resources.lib.data_collector import _jsonrpc, get_item_context
+from resources.lib.utilities import log
+
+VIDEO_PLAYER = 1
+VIDEO_PLAYLIST = 1
+# let playback settle before reading ahead
+PREFETCH_DELAY = 30
+# seconds between two prefetched searches, keeps well below the API's rate limit
+PREFETCH_INTERVAL = 10
+PLAYLIST_ITEM_PROPERTIES = ["title", "originaltitle", "year", "showtitle", "season", "episode", "tvshowid",
+                            "imdbnumber", "uniqueid", "file"]
+# paths whose hash or metadata can't be known before they play
+SKIPPED_SCHEMES = ("http://", "https://", "plugin://", "pvr://", "upnp://")
+
+
+class PlaylistPrefetcher(object):
+    """Runs the subtitle searches of the next items of the video playlist while the current one plays.
+
+    search(context) searches for the item context describes and returns False when the API asks
+    to slow down, which ends the run."""
+
+    def __init__(self, monitor, player, search):
+        self.monitor = monitor
+        self.player = player
+        self.search = search
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, count):
+        """Prefetches the next count playlist items, unless a run is in progress."""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, args=(count,), name="playlist_prefetcher")
+            self._thread.start()
+
+    def _run(self, count):
+        if self.monitor.waitForAbort(PREFETCH_DELAY) or not self.player.isPlayingVideo():
+            return
+        items = self.get_next_items(count)
+        log(__name__, f"prefetching {len(items)} playlist items")
+        for item in items:
+            if self.monitor.abortRequested() or not self.player.isPlayingVideo():
+                return
+            if item.get("file", "").startswith(SKIPPED_SCHEMES):
+                continue
+            log(__name__, f"prefetching {item.get('label')}")
+            if self.search(get_item_context(item)) is False:
+                log(__name__, "rate limited, stopping prefetch")
+                return
+            if self.monitor.waitForAbort(PREFETCH_INTERVAL):
+                return
+
+    def get_next_items(self, count):
+        """Returns the count items after the playing one in the video playlist."""
+        player = _jsonrpc("Player.GetProperties", {"playerid": VIDEO_PLAYER, "properties": ["position"]},
+                          use_cache=False) or {}
+        position = player.get("position", -1)
+        if position < 0:
+            return []
+        result = _jsonrpc("Playlist.GetItems", {"playlistid": VIDEO_PLAYLIST, "properties": PLAYLIST_ITEM_PROPERTIES,
+                                                "limits": {"start": position + 1, "end": position + 1 + count}},
+                          use_cache=False) or {}
+        return result.get("items") or []
@@ -0,0 +1,28 @@
+import os
+import sqlite3
+
+import xbmcvfs
+
+from resources.lib.utilities import log, __addon__
+
+__profile__ = xbmcvfs.translatePath(__addon__.getAddonInfo("profile"))
+
+# seconds a writer waits for another Kodi process to release the database
+DATABASE_TIMEOUT = 10
+
+
+def open_database(name):
+    """Opens (and creates if needed) a SQLite database in the add-on profile directory.
+
+    Connections run in autocommit mode with WAL journaling, so several plugin
+    invocations can read and write the same file at once."""
+    if not xbmcvfs.exists(__profile__):
+        xbmcvfs.mkdirs(__profile__)
+    path = os.path.join(__profile__, name)
+    log(__name__, f"opening database {path}")
+    connection = sqlite3.connect(path, timeout=DATABASE_TIMEOUT, isolation_level=None, check_same_thread=False)
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")
+    except sqlite3.DatabaseError as e:
+        log(__name__, f"WAL journal not available for {name}: {e}")
+    return connection
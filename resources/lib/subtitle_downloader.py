@@ -1,7 +1,10 @@
 
+import json
 import os
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from time import time
 import xbmc
 
 
@@ -11,12 +14,17 @@ import xbmcgui
 import xbmcplugin
 import xbmcvfs
 
-from resources.lib.data_collector import get_language_data, get_media_data, get_file_path, convert_language, \
+from resources.lib import metrics
+from resources.lib.broker import BrokeredProvider
+from resources.lib.cache import Cache
+from resources.lib.data_collector import get_language_data, get_media_data, get_player_context, convert_language, \
     clean_feature_release_name, get_flag
 from resources.lib.exceptions import AuthenticationError, ConfigurationError, DownloadLimitExceeded, ProviderError, \
     ServiceUnavailable, TooManyRequests, BadUsernameError
 from resources.lib.file_operations import get_file_data
-from resources.lib.os.provider import OpenSubtitlesProvider
+from resources.lib.hash_cache import get_hash_cache
+from resources.lib.metrics import get_counters
+from resources.lib.subtitle_store import SubtitleStore
 from resources.lib.utilities import get_params, log, error
 
 __addon__ = xbmcaddon.Addon()
@@ -25,11 +33,81 @@ __scriptid__ = __addon__.getAddonInfo("id")
 __profile__ = xbmcvfs.translatePath(__addon__.getAddonInfo("profile"))
 __temp__ = xbmcvfs.translatePath(os.path.join(__profile__, "temp", ""))
 
+# get_file_data, get_language_data and get_media_data of build_query
+QUERY_STAGE_WORKERS = 3
+
 if xbmcvfs.exists(__temp__):
     shutil.rmtree(__temp__)
 xbmcvfs.mkdirs(__temp__)
 
 
+def _run_stage(name, func, *args):
+    started = time()
+    try:
+        return func(*args)
+    finally:
+        elapsed = time() - started
+        metrics.observe(f"build_query.{name}", elapsed)
+        log(__name__, f"{name} took {elapsed * 1000:.0f}ms")
+
+
+def build_query(params, query="", context=None):
+    """Collects file, language and media data of the playing item, or of context, into a search query.
+
+    The three are independent, so they are collected at the same time."""
+    started = time()
+    if context is None:
+        context = get_player_context()
+    with ThreadPoolExecutor(max_workers=QUERY_STAGE_WORKERS) as executor:
+        file_future = executor.submit(_run_stage, "file_data", get_file_data, context["file"])
+        language_future = executor.submit(_run_stage, "language_data", get_language_data, params)
+        # if there's query passed we use it, don't try to pull media data from VideoPlayer
+        media_future = None if query else executor.submit(_run_stage, "media_data", get_media_data, context)
+        file_data = file_future.result()
+        language_data = language_future.result()
+        media_data = media_future.result() if media_future else {"query": query}
+    log(__name__, f"query data collected in {(time() - started) * 1000:.0f}ms")
+
+    log(__name__, "file_data '%s' " % file_data)
+    log(__name__, "language_data '%s' " % language_data)
+
+    if not query:
+        # Only use basename as fallback if no query was set by media data collection
+        if "basename" in file_data and not media_data.get("query"):
+            media_data["query"] = file_data["basename"]
+            log(__name__, f"Using basename as query fallback: {file_data['basename']}")
+        elif media_data.get("query"):
+            log(__name__, f"Using parsed query from media_data: {media_data['query']}")
+        log(__name__, "media_data '%s' " % media_data)
+
+    return {**media_data, **file_data, **language_data}
+
+
+def get_cache_stats():
+    """Returns the cache metrics of all invocations with the size gauges of every cache."""
+    stats = get_counters()
+    # the caches of OpenSubtitlesProvider, read from the store without creating a provider
+    for cache in (Cache(key_prefix="os_com_search", name="search"), Cache(key_prefix="os_com", name="token")):
+        for gauge, value in cache.stats().items():
+            stats[f"cache.{cache.name}.{gauge}"] = value
+    for gauge, value in SubtitleStore().stats().items():
+        stats[f"cache.subtitles.{gauge}"] = value
+    hash_cache = get_hash_cache()
+    if hash_cache:
+        for gauge, value in hash_cache.stats().items():
+            stats[f"cache.hash.{gauge}"] = value
+    return stats
+
+
+def show_cache_stats():
+    """Dumps get_cache_stats as JSON to the log, the profile and a text viewer."""
+    stats_json = json.dumps(get_cache_stats(), indent=2, sort_keys=True)
+    log(__name__, f"cache stats: {stats_json}")
+    with open(os.path.join(__profile__, "cache_stats.json"), "w") as stats_file:
+        stats_file.write(stats_json)
+    xbmcgui.Dialog().textviewer(__addon__.getAddonInfo("name"), stats_json)
+
+
 class SubtitleDownloader:
 
     def __init__(self):
@@ -46,9 +124,11 @@ class SubtitleDownloader:
         self.query = {}
         self.subtitles = {}
         self.file = {}
+        self.open_subtitles = None
+        self.subtitle_store = SubtitleStore()
 
         try:
-            self.open_subtitles = OpenSubtitlesProvider(self.api_key, self.username, self.password)
+            self.open_subtitles = BrokeredProvider(self.api_key, self.username, self.password)
         except ConfigurationError as e:
             error(__name__, 32002, e)
 
@@ -62,26 +142,7 @@ class SubtitleDownloader:
             self.download()
 
     def search(self, query=""):
-        file_data = get_file_data(get_file_path())
-        language_data = get_language_data(self.params)
-
-        log(__name__, "file_data '%s' " % file_data)
-        log(__name__, "language_data '%s' " % language_data)
-
-        # if there's query passed we use it, don't try to pull media data from VideoPlayer
-        if query:
-            media_data = {"query": query}
-        else:
-            media_data = get_media_data()
-            # Only use basename as fallback if no query was set by media data collection
-            if "basename" in file_data and not media_data.get("query"):
-                media_data["query"] = file_data["basename"]
-                log(__name__, f"Using basename as query fallback: {file_data['basename']}")
-            elif media_data.get("query"):
-                log(__name__, f"Using parsed query from media_data: {media_data['query']}")
-            log(__name__, "media_data '%s' " % media_data)
-
-        self.query = {**media_data, **file_data, **language_data}
+        self.query = build_query(self.params, query)
 
         try:
             self.subtitles = self.open_subtitles.search_subtitles(self.query)
@@ -102,11 +163,21 @@ class SubtitleDownloader:
             log(__name__, "No subtitle found")
 
     def download(self):
+        # stacked files get one comma separated file_id per part, in part order
+        file_ids = self.params["id"].split(",")
+        subtitle_files = []
         valid = 1
         try:
-            self.file = self.open_subtitles.download_subtitle(
-                {"file_id": self.params["id"], "sub_format": self.sub_format})
-            log(__name__, "XYXYXX download '%s' " % self.file)
+            for file_id in file_ids:
+                content = self.subtitle_store.get(file_id, self.sub_format)
+                if content:
+                    self.file = {"content": content}
+                else:
+                    self.file = self.open_subtitles.download_subtitle(
+                        {"file_id": file_id, "sub_format": self.sub_format})
+                    log(__name__, "XYXYXX download '%s' " % self.file)
+                    self.subtitle_store.set(file_id, self.sub_format, self.file["content"])
+                subtitle_files.append(self.file)
         except AuthenticationError as e:
             error(__name__, 32003, e)
             valid = 0
@@ -151,19 +222,27 @@ class SubtitleDownloader:
         if not xbmcvfs.exists(dir_path):  # lets create custom OSS sub directory if not exists
             xbmcvfs.mkdir(dir_path)
 
-        subtitle_path = os.path.join(dir_path, "{0}.{1}.{2}".format('TempSubtitle', self.params["language"], self.sub_format))   
-        
-        log(__name__, "XYXYXX download subtitle_path: {}".format(subtitle_path))
+        subtitle_paths = []
+        for part, file_id in enumerate(file_ids, 1):
+            if len(file_ids) > 1:
+                name = "{0}.CD{1}".format('TempSubtitle', part)
+            else:
+                name = 'TempSubtitle'
+            subtitle_paths.append(os.path.join(dir_path, "{0}.{1}.{2}".format(name, self.params["language"], self.sub_format)))
+
+        log(__name__, "XYXYXX download subtitle_path: {}".format(subtitle_paths))
 
 
         if (valid==1):
-            tmp_file = open(subtitle_path, "w" + "b")
-            tmp_file.write(self.file["content"])
-            tmp_file.close()
+            for subtitle_path, subtitle_file in zip(subtitle_paths, subtitle_files):
+                tmp_file = open(subtitle_path, "w" + "b")
+                tmp_file.write(subtitle_file["content"])
+                tmp_file.close()
         
 
-        list_item = xbmcgui.ListItem(label=subtitle_path)
-        xbmcplugin.addDirectoryItem(handle=self.handle, url=subtitle_path, listitem=list_item, isFolder=False)
+        for subtitle_path in subtitle_paths:
+            list_item = xbmcgui.ListItem(label=subtitle_path)
+            xbmcplugin.addDirectoryItem(handle=self.handle, url=subtitle_path, listitem=list_item, isFolder=False)
 
         return
 
@@ -173,6 +252,14 @@ class SubtitleDownloader:
         #    listitem = xbmcgui.ListItem(label=sub)
         #    xbmcplugin.addDirectoryItem(handle=int(sys.argv[1]), url=sub, listitem=listitem, isFolder=False)
 
+    def get_file_ids(self, files):
+        """Comma separated file_ids to download: one per CD for a stack split the same way, else the first."""
+        stack_size = self.query.get("stack_size", 1)
+        if stack_size > 1 and len(files) == stack_size:
+            files = sorted(files, key=lambda x: x.get("cd_number") or 0)
+            return ",".join(str(file["file_id"]) for file in files)
+        return str(files[0]["file_id"])
+
     def list_subtitles(self):
         """TODO rewrite using new data. do not forget Series/Episodes"""
         if self.subtitles:
@@ -200,9 +287,9 @@ class SubtitleDownloader:
                 
                 list_item.setProperty("sync", "true" if ("moviehash_match" in attributes and attributes["moviehash_match"]) else "false")
                 list_item.setProperty("hearing_imp", "true" if attributes["hearing_impaired"] else "false")
-                """TODO take care of multiple cds id&id or something"""
+                file_ids = self.get_file_ids(attributes["files"])
                 #url = f"plugin://{__scriptid__}/?action=download&id={attributes['files'][0]['file_id']}"
-                url = f"plugin://{__scriptid__}/?action=download&id={attributes['files'][0]['file_id']}&language={language}"    
+                url = f"plugin://{__scriptid__}/?action=download&id={file_ids}&language={language}"    
                 log(__name__, "XYXYXX download list_subtitles: language in url {url}")
 
                 xbmcplugin.addDirectoryItem(handle=self.handle, url=url, listitem=list_item, isFolder=False)
@@ -0,0 +1,92 @@
+import os
+import re
+
+from resources.lib import metrics
+from resources.lib.storage import __profile__
+from resources.lib.utilities import log
+
+SUBTITLE_STORE_DIRECTORY = "subtitles"
+# total size of the stored subtitles, least recently used files go first
+SUBTITLE_STORE_BYTE_BUDGET = 32 * 1024 * 1024
+
+
+class SubtitleStore(object):
+    """Keeps downloaded subtitles in the add-on profile, one file per file_id and format.
+
+    Repeated downloads of a file_id are served from here without calling the API, so they cost no
+    download quota. The modification time of a file records its last use for the LRU eviction."""
+
+    def __init__(self, byte_budget=SUBTITLE_STORE_BYTE_BUDGET):
+        self.byte_budget = byte_budget
+        self.path = os.path.join(__profile__, SUBTITLE_STORE_DIRECTORY)
+
+    def get(self, file_id, sub_format):
+        """Returns the stored subtitle content as bytes, or None."""
+        path = self._get_path(file_id, sub_format)
+        try:
+            with open(path, "rb") as subtitle_file:
+                content = subtitle_file.read()
+            os.utime(path)
+        except OSError:
+            metrics.increment("cache.subtitles.misses")
+            return None
+        metrics.increment("cache.subtitles.hits")
+        log(__name__, f"got subtitle {file_id} from store")
+        return content
+
+    def set(self, file_id, sub_format, content):
+        if not content:
+            return
+        path = self._get_path(file_id, sub_format)
+        try:
+            os.makedirs(self.path, exist_ok=True)
+            # written aside and renamed, so a concurrent get never sees a partial file
+            with open(path + ".part", "wb") as subtitle_file:
+                subtitle_file.write(content)
+            os.replace(path + ".part", path)
+            log(__name__, f"stored subtitle {file_id}")
+            self._evict()
+        except OSError as e:
+            log(__name__, f"failed to store subtitle {file_id}: {e}")
+
+    def stats(self):
+        """Returns the number of stored subtitles and their total size."""
+        files = self._list_files()
+        return {"entries": len(files), "bytes": sum(size for _, size, _ in files)}
+
+    def _get_path(self, file_id, sub_format):
+        # file ids come from plugin urls, keep them from escaping the store directory
+        file_id, sub_format = (re.sub(r"[^\w-]", "_", str(part)) for part in (file_id, sub_format))
+        return os.path.join(self.path, f"{file_id}.{sub_format}")
+
+    def _list_files(self):
+        files = []
+        try:
+            entries = list(os.scandir(self.path))
+        except OSError:
+            return files
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            if entry.is_file() and not entry.name.endswith(".part"):
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict(self):
+        files = self._list_files()
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for path, size, _ in sorted(files, key=lambda file: file[2]):
+            if total <= self.byte_budget:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        if evicted:
+            metrics.increment("cache.subtitles.evictions", evicted)
+            log(__name__, f"evicted {evicted} subtitles")
@@ -0,0 +1,15 @@
+import sys
+
+from resources.lib import metrics
+from resources.lib.subtitle_downloader import show_cache_stats
+from resources.lib.utilities import log
+
+# RunScript(service.subtitles.opensubtitles-com,<action>) entry points of the settings dialog
+SCRIPT_ACTIONS = {"cache_stats": show_cache_stats}
+
+action = sys.argv[1] if len(sys.argv) > 1 else ""
+if action in SCRIPT_ACTIONS:
+    SCRIPT_ACTIONS[action]()
+else:
+    log(__name__, f"unknown script action '{action}'")
+metrics.flush()
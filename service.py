@@ -2,9 +2,12 @@
 import sys
 import xbmcplugin
 
+from resources.lib import metrics
 from resources.lib.subtitle_downloader import SubtitleDownloader
 
 
 SubtitleDownloader().handle_action()
 
 xbmcplugin.endOfDirectory(int(sys.argv[1]))
+# after the listing, so Kodi doesn't wait for the write
+metrics.flush()
@@ -0,0 +1,17 @@
+"""Benchmarks of the add-on's hot paths, run from the repository root, e.g.
+
+    python -m tests.benchmarks.hashing
+
+Each prints its timings, they are not part of the test run."""
+import timeit
+
+from tests import kodi_stubs  # noqa: F401, installs the Kodi modules before resources.lib is imported
+
+
+def best_time(func, number=100, repeat=5):
+    """Returns the best time of one call of func, in seconds, over repeat runs of number calls."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def report(name, seconds):
+    print(f"{name:<50} {seconds * 1000:>12.3f} ms")
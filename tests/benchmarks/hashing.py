@@ -0,0 +1,39 @@
+"""Sums the 128 KiB moviehash buffer with sum_longs and with the per-word loop it replaced."""
+import os
+import struct
+
+from resources.lib.file_operations import HASH_CHUNK_SIZE, LONG_LONG_SIZE, sum_longs
+from tests.benchmarks import best_time, report
+
+
+def sum_longs_per_word(buffer, hash_=0):
+    for x in range(len(buffer) // LONG_LONG_SIZE):
+        size = x * LONG_LONG_SIZE
+        (l_value,) = struct.unpack("q", buffer[size:size + LONG_LONG_SIZE])
+        hash_ += l_value
+        hash_ = hash_ & 0xFFFFFFFFFFFFFFFF
+    return hash_
+
+
+def sum_longs_unpack(buffer, hash_=0):
+    """The fallback of sum_longs for big-endian platforms."""
+    count = len(buffer) // LONG_LONG_SIZE
+    return (hash_ + sum(struct.unpack(f"<{count}q", buffer))) & 0xFFFFFFFFFFFFFFFF
+
+
+def main():
+    buffer = os.urandom(HASH_CHUNK_SIZE * 2)
+    size = len(buffer)
+    assert sum_longs(buffer, size) == sum_longs_per_word(buffer, size) == sum_longs_unpack(buffer, size)
+
+    per_word = best_time(lambda: sum_longs_per_word(buffer, size), number=10)
+    report("per-word struct.unpack loop", per_word)
+    for name, func in (("sum_longs, memoryview cast", sum_longs), ("sum_longs, single struct.unpack", sum_longs_unpack),
+                       ("sum_longs, bytearray from xbmcvfs", lambda b, h: sum_longs(bytearray(b), h))):
+        seconds = best_time(lambda: func(buffer, size))
+        report(name, seconds)
+        print(f"{'':<50} {per_word / seconds:>11.0f}x faster")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Reads the moviehash head and tail sequentially and in parallel, with a simulated VFS round trip per read."""
+import os
+import tempfile
+import time
+
+import xbmcvfs
+
+from resources.lib.file_operations import HASH_CHUNK_SIZE, read_head_tail, read_head_tail_parallel
+from tests.benchmarks import best_time, report
+
+ROUND_TRIPS = (0, 0.005, 0.02, 0.05)
+
+
+def main():
+    with tempfile.NamedTemporaryFile(suffix=".mkv", delete=False) as video:
+        video.write(os.urandom(HASH_CHUNK_SIZE * 16))
+    read_bytes = xbmcvfs.File.readBytes
+    try:
+        assert read_head_tail(video.name) == read_head_tail_parallel(video.name)
+        for round_trip in ROUND_TRIPS:
+            def slow_read(f, count=-1):
+                time.sleep(round_trip)
+                return read_bytes(f, count)
+
+            xbmcvfs.File.readBytes = slow_read
+            number = 20 if round_trip else 200
+            sequential = best_time(lambda: read_head_tail(video.name), number=number, repeat=3)
+            parallel = best_time(lambda: read_head_tail_parallel(video.name), number=number, repeat=3)
+            report(f"sequential, {round_trip * 1000:.0f} ms round trip", sequential)
+            report(f"parallel, {round_trip * 1000:.0f} ms round trip", parallel)
+    finally:
+        xbmcvfs.File.readBytes = read_bytes
+        os.remove(video.name)
+
+
+if __name__ == "__main__":
+    main()
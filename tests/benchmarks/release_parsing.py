@@ -0,0 +1,24 @@
+"""Times parse_release_name per filename, the local parse that runs before any guessit API call.
+
+The filenames are the RELEASE_NAMES of the tests plus release names of tests.search_fixtures."""
+from resources.lib.data_collector import parse_release_name
+from tests.benchmarks import best_time, report
+from tests.search_fixtures import build_search_response
+from tests.test_data_collector import RELEASE_NAMES
+
+FEATURES = [("The Matrix", 1999, 133093), ("Inception", 2010, 1375666), ("Blade Runner 2049", 2017, 1856101)]
+
+
+def main():
+    filenames = [filename for filename, _ in RELEASE_NAMES]
+    filenames += [row["attributes"]["files"][0]["file_name"] for title, year, imdb_id in FEATURES
+                  for row in build_search_response(title, year, imdb_id, count=100, seed=imdb_id)]
+    seconds = best_time(lambda: [parse_release_name(filename) for filename in filenames], number=20)
+    report(f"parse_release_name, {len(filenames)} filenames", seconds)
+    report("parse_release_name, per filename", seconds / len(filenames))
+    slowest = max(filenames, key=lambda filename: best_time(lambda: parse_release_name(filename), number=200))
+    report(f"slowest: {slowest[:40]}", best_time(lambda: parse_release_name(slowest), number=200))
+
+
+if __name__ == "__main__":
+    main()
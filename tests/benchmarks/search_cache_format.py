@@ -0,0 +1,49 @@
+"""Compares the stored size and encode/decode time of search results in the cache formats.
+
+- window JSON: the raw API rows as JSON in a home window property, the original cache;
+- raw zlib JSON: the raw rows as compressed JSON in the SQLite store;
+- projected zlib JSON: project_subtitles rows as compressed JSON, what the search cache stores now.
+
+The rows come from tests.search_fixtures, pages of 60 varied rows for several features."""
+import json
+import zlib
+
+from resources.lib.cache import Cache
+from resources.lib.os.provider import project_subtitles
+from tests.benchmarks import best_time, report
+from tests.search_fixtures import build_search_response
+
+FEATURES = [("The Matrix", 1999, 133093), ("Inception", 2010, 1375666), ("Amelie", 2001, 211915),
+            ("Blade Runner 2049", 2017, 1856101), ("Dune Part Two", 2024, 15239678)]
+PAGE_SIZE = 60
+
+
+def window_json(data):
+    return json.dumps(dict(value=data, expires=0)).encode("utf-8")
+
+
+def zlib_json(data):
+    return zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+
+def main():
+    pages = [build_search_response(title, year, imdb_id, count=PAGE_SIZE, seed=imdb_id)
+             for title, year, imdb_id in FEATURES]
+    rows = len(pages) * PAGE_SIZE
+    formats = (
+        ("window JSON", lambda page: window_json(page), lambda stored: json.loads(stored.decode("utf-8"))["value"]),
+        ("raw zlib JSON", zlib_json, Cache._decode),
+        ("projected zlib JSON", lambda page: zlib_json(project_subtitles(page)), Cache._decode),
+    )
+    baseline = None
+    for name, encode, decode in formats:
+        stored = [encode(page) for page in pages]
+        size = sum(len(entry) for entry in stored) / rows
+        baseline = baseline or size
+        print(f"{name:<50} {size:>12.0f} bytes per row, 1/{baseline / size:.1f} of window JSON")
+        report(f"{name}, encode a page", best_time(lambda: [encode(page) for page in pages], number=20) / len(pages))
+        report(f"{name}, decode a page", best_time(lambda: [decode(entry) for entry in stored], number=20) / len(pages))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Ranks 10k library titles against misspelled queries with the trigram matcher and with SequenceMatcher.
+
+Also counts how often each ranks the title a query was made from first, the way
+_select_best_movie_match picks from library candidates. 10k titles overflow the prepare cache,
+so the trigram matcher is timed on title strings and on titles prepared beforehand."""
+from difflib import SequenceMatcher
+
+from resources.lib.matcher import prepare, similarity
+from tests.benchmarks import best_time, report
+from tests.title_fixtures import build_queries, build_titles
+
+TITLES = 10000
+QUERIES = 20
+
+
+def rank_trigrams(query, titles):
+    search = prepare(query)
+    return max(titles, key=lambda title: similarity(search, title))
+
+
+def rank_prepared(query, titles):
+    search = prepare(query)
+    return max(titles, key=lambda title: similarity(search, title)).text
+
+
+def rank_sequence_matcher(query, titles):
+    query = query.lower()
+    return max(titles, key=lambda title: SequenceMatcher(None, query, title.lower()).ratio())
+
+
+def main():
+    titles = build_titles(TITLES)
+    queries = build_queries(titles, QUERIES)
+    prepared = [prepare(title) for title in titles]
+    for name, rank, candidates in (("SequenceMatcher", rank_sequence_matcher, titles),
+                                   ("trigram matcher", rank_trigrams, titles),
+                                   ("trigram matcher, prepared titles", rank_prepared, prepared)):
+        found = sum(rank(query, candidates) == title for query, title in queries)
+        seconds = best_time(lambda: [rank(query, candidates) for query, _ in queries], number=1, repeat=3)
+        report(f"{name}, rank {TITLES} titles", seconds / len(queries))
+        print(f"{name:<50} {found:>9}/{len(queries)} queries found their title")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+from tests import kodi_stubs  # noqa: F401, installs the Kodi modules before resources.lib is imported
@@ -0,0 +1,103 @@
+"""Minimal stand-ins for the Kodi modules, so resources.lib can be imported outside Kodi.
+
+xbmcvfs.File reads real files and the add-on profile is a temporary directory."""
+import os
+import sys
+import tempfile
+import types
+
+PROFILE = tempfile.mkdtemp(prefix="opensubtitles-profile-")
+
+
+class _File(object):
+
+    def __init__(self, path, mode="r"):
+        self._f = open(path, "rb" if mode == "r" else "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def size(self):
+        return os.fstat(self._f.fileno()).st_size
+
+    def seek(self, offset, whence=0):
+        return self._f.seek(offset, whence)
+
+    def readBytes(self, count=-1):
+        return bytearray(self._f.read(count))
+
+    def close(self):
+        self._f.close()
+
+
+class _Stat(object):
+
+    def __init__(self, path):
+        self._stat = os.stat(path)
+
+    def st_size(self):
+        return self._stat.st_size
+
+    def st_mtime(self):
+        return int(self._stat.st_mtime)
+
+
+class _Addon(object):
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def getAddonInfo(self, key):
+        return PROFILE if key == "profile" else "OpenSubtitles.com"
+
+    def getLocalizedString(self, string_id):
+        return str(string_id)
+
+    def getSetting(self, key):
+        return ""
+
+
+class _Monitor(object):
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=None):
+        return False
+
+
+class _Window(object):
+    properties = {}
+
+    def __init__(self, window_id=None):
+        pass
+
+    def getProperty(self, key):
+        return self.properties.get(key, "")
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def clearProperty(self, key):
+        self.properties.pop(key, None)
+
+
+def _module(name, **attributes):
+    module = types.ModuleType(name)
+    module.__dict__.update(attributes)
+    sys.modules.setdefault(name, module)
+
+
+_module("xbmc", LOGDEBUG=0, ENGLISH_NAME=2, log=lambda msg, level=0: None, getInfoLabel=lambda label: "",
+        executeJSONRPC=lambda request: "{}", convertLanguage=lambda language, format_: "",
+        getLanguage=lambda format_=2, region=True: "English", Monitor=_Monitor, Player=object)
+_module("xbmcaddon", Addon=_Addon)
+_module("xbmcgui", Window=_Window, Dialog=object, ListItem=object)
+_module("xbmcplugin")
+_module("xbmcvfs", File=_File, Stat=_Stat, translatePath=lambda path: path, exists=os.path.exists,
+        mkdirs=lambda path: os.makedirs(path, exist_ok=True))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,77 @@
+"""Stored (uncompressed) RAR4 and RAR5 volume sets, built to the format specs."""
+import struct
+import zlib
+
+from resources.lib.file_operations import RAR5_SIGNATURE
+
+
+def vint(value):
+    encoded = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if not value:
+            encoded.append(byte)
+            return bytes(encoded)
+        encoded.append(byte | 0x80)
+
+
+def rar5_block(header_type, flags, fields, data_size=None):
+    if data_size is not None:
+        flags |= 0x0002
+    header = vint(header_type) + vint(flags) + (vint(data_size) if data_size is not None else b"") + fields
+    header = vint(len(header)) + header
+    return struct.pack("<I", zlib.crc32(header)) + header
+
+
+def build_rar5_volumes(content, volume_size):
+    """A stored RAR5 volume set as rar writes it: every volume volume_size bytes, the last one shorter.
+
+    Volumes after the first carry a volume number in their main header, so they hold less data."""
+    volumes = []
+    offset = 0
+    while offset < len(content):
+        number = len(volumes)
+        archive_flags = 0x0001 | (0x0002 if number else 0)
+        main = rar5_block(1, 0, vint(archive_flags) + (vint(number) if number else b""))
+
+        def file_block(data_size, last):
+            flags = (0x0008 if number else 0) | (0 if last else 0x0010)
+            fields = (vint(0x0004) + vint(len(content)) + vint(0x20) + struct.pack("<I", zlib.crc32(content)) +
+                      vint(0) + vint(0) + vint(len(b"movie.mkv")) + b"movie.mkv")
+            return rar5_block(2, flags, fields, data_size)
+
+        end = rar5_block(5, 0, vint(0x0001))
+        headers_size = len(RAR5_SIGNATURE) + len(main) + len(file_block(volume_size, False)) + len(end)
+        data_size = min(volume_size - headers_size, len(content) - offset)
+        last = offset + data_size == len(content)
+        volumes.append(RAR5_SIGNATURE + main + file_block(data_size, last) + content[offset:offset + data_size] +
+                       rar5_block(5, 0, vint(0 if last else 0x0001)))
+        offset += data_size
+    return volumes
+
+
+def rar4_block(header_type, flags, fields):
+    header = struct.pack("<BHH", header_type, flags, 7 + len(fields)) + fields
+    return struct.pack("<H", zlib.crc32(header) & 0xFFFF) + header
+
+
+def build_rar4_volumes(content, volume_size):
+    volumes = []
+    offset = 0
+    while offset < len(content):
+        main = rar4_block(0x73, 0x0001 | (0 if volumes else 0x0100), b"\0" * 6)
+
+        def file_block(data_size, last):
+            flags = 0x8000 | (0x0001 if volumes else 0) | (0 if last else 0x0002)
+            return rar4_block(0x74, flags, struct.pack("<IIBIIBBHI", data_size, len(content), 2, zlib.crc32(content),
+                                                        0, 29, 0x30, len(b"movie.mkv"), 0x20) + b"movie.mkv")
+
+        end = rar4_block(0x7B, 0x0001, b"")
+        headers_size = 7 + len(main) + len(file_block(0, False)) + len(end)
+        data_size = min(volume_size - headers_size, len(content) - offset)
+        last = offset + data_size == len(content)
+        volumes.append(b"Rar!\x1a\x07\x00" + main + file_block(data_size, last) + content[offset:offset + data_size] +
+                       end)
+        offset += data_size
+    return volumes
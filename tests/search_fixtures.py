@@ -0,0 +1,76 @@
+"""Search results laid out like the /subtitles responses of the OpenSubtitles.com API.
+
+Rows differ the way real pages do: release names, uploaders, comments, counts, dates and hashes."""
+import random
+
+RELEASE_GROUPS = ["SPARKS", "RARBG", "YTS.MX", "FGT", "NTb", "CMRG", "EVO", "GalaxyRG", "TERMiNAL", "playWEB"]
+SOURCES = ["BluRay", "WEB-DL", "WEBRip", "HDRip", "BRRip", "DVDRip", "HDTV"]
+CODECS = ["x264", "x265", "H.264", "HEVC", "XviD"]
+LANGUAGES = ["en", "fr", "de", "es", "pt-br", "nl", "it", "pl", "ro", "el"]
+RANKS = ["Trusted member", "Gold member", "Sub Translator", "anonymous", "bronze member", "Administrator"]
+COMMENTS = ["", "", "Resync for {release}", "Corrected some typos. Enjoy!", "HI removed",
+            "Synced and corrected by {uploader}", "Retail subtitles, OCR and spell checked"]
+
+
+def build_search_response(title, year, imdb_id, count=60, seed=0):
+    """Returns the data list of a search result page with count rows for one feature."""
+    rng = random.Random(seed)
+    data = []
+    for _ in range(count):
+        subtitle_id = rng.randint(1000000, 9999999)
+        uploader = f"user{rng.randint(1, 99999)}"
+        release = (f"{title.replace(' ', '.')}.{year}.{rng.choice(['720p', '1080p', '2160p', ''])}."
+                   f"{rng.choice(SOURCES)}.{rng.choice(CODECS)}-{rng.choice(RELEASE_GROUPS)}").replace("..", ".")
+        language = rng.choice(LANGUAGES)
+        nb_cd = 1 if rng.random() < 0.95 else 2
+        slug = f"{year}-{title.lower().replace(' ', '-')}"
+        data.append({
+            "id": str(subtitle_id),
+            "type": "subtitle",
+            "attributes": {
+                "subtitle_id": str(subtitle_id),
+                "language": language,
+                "download_count": rng.randint(0, 500000),
+                "new_download_count": rng.randint(0, 5000),
+                "hearing_impaired": rng.random() < 0.2,
+                "hd": rng.random() < 0.7,
+                "fps": rng.choice([23.976, 24.0, 25.0, 29.97, 0.0]),
+                "votes": rng.randint(0, 40),
+                "ratings": round(rng.uniform(0, 10), 1),
+                "from_trusted": rng.random() < 0.3,
+                "foreign_parts_only": rng.random() < 0.05,
+                "upload_date": f"20{rng.randint(10, 24):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T"
+                               f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}Z",
+                "file_hashes": [f"{rng.getrandbits(64):016x}" for _ in range(rng.randint(0, 3))],
+                "ai_translated": rng.random() < 0.05,
+                "nb_cd": nb_cd,
+                "slug": f"{subtitle_id}-{slug}",
+                "machine_translated": rng.random() < 0.05,
+                "release": release,
+                "comments": rng.choice(COMMENTS).format(release=release, uploader=uploader),
+                "legacy_subtitle_id": rng.randint(1000000, 9999999),
+                "legacy_uploader_id": rng.randint(1, 9999999),
+                "uploader": {"uploader_id": rng.randint(1, 999999), "name": uploader, "rank": rng.choice(RANKS)},
+                "feature_details": {
+                    "feature_id": imdb_id * 7 % 1000000,
+                    "feature_type": "Movie",
+                    "year": year,
+                    "title": title,
+                    "movie_name": f"{year} - {title}",
+                    "imdb_id": imdb_id,
+                    "tmdb_id": imdb_id % 100000,
+                },
+                "url": f"https://www.opensubtitles.com/{language}/subtitles/{subtitle_id}-{slug}",
+                "related_links": [{
+                    "label": f"All subtitles for {title}",
+                    "url": f"https://www.opensubtitles.com/{language}/movies/{slug}",
+                    "img_url": f"https://s9.opensubtitles.com/features/{rng.randint(1, 9)}/{rng.randint(0, 9)}/"
+                               f"{rng.randint(10, 99)}/{imdb_id}.jpg",
+                }],
+                "files": [{"file_id": rng.randint(1000000, 9999999), "cd_number": cd,
+                           "file_name": f"{release}{f'.cd{cd}' if nb_cd > 1 else ''}.srt"}
+                          for cd in range(1, nb_cd + 1)],
+                "moviehash_match": rng.random() < 0.1,
+            },
+        })
+    return data
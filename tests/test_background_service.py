@@ -0,0 +1,43 @@
+import pytest
+import xbmc
+
+from resources.lib import background_service
+from resources.lib.background_service import get_subtitle_language_params
+
+LANGUAGE_NAMES = {"ger": "German", "fre": "French"}
+
+
+@pytest.fixture
+def kodi(monkeypatch):
+    state = {"languages": ["English", "Spanish"], "preferred": "original", "audio": "ger"}
+
+    def jsonrpc(method, params=None, use_cache=True):
+        if method == "Settings.GetSettingValue":
+            return {"value": state["languages"] if params["setting"] == "subtitles.languages" else state["preferred"]}
+        if method == "Player.GetProperties":
+            return {"currentaudiostream": {"language": state["audio"]}}
+
+    monkeypatch.setattr(background_service, "_jsonrpc", jsonrpc)
+    monkeypatch.setattr(xbmc, "convertLanguage", lambda language, format_: LANGUAGE_NAMES.get(language, ""),
+                        raising=False)
+    monkeypatch.setattr(xbmc, "getLanguage", lambda format_=None, region=True: "French", raising=False)
+    return state
+
+
+def test_original_is_the_audio_language(kodi):
+    assert get_subtitle_language_params() == {"languages": "English,Spanish", "preferredlanguage": "German"}
+
+
+def test_original_with_unknown_audio_language(kodi):
+    kodi["audio"] = ""
+    assert get_subtitle_language_params()["preferredlanguage"] == "Unknown"
+
+
+def test_default_is_the_interface_language(kodi):
+    kodi["preferred"] = "default"
+    assert get_subtitle_language_params()["preferredlanguage"] == "French"
+
+
+def test_language_name_is_passed_on(kodi):
+    kodi["preferred"] = "Italian"
+    assert get_subtitle_language_params()["preferredlanguage"] == "Italian"
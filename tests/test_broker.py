@@ -0,0 +1,28 @@
+import socket
+
+from resources.lib import broker
+from resources.lib.broker import BROKER_HOST, BrokerServer
+
+
+def test_silent_client_does_not_hold_handler(monkeypatch):
+    monkeypatch.setattr(broker, "REQUEST_TIMEOUT", 0.2)
+    server = BrokerServer()
+    server.start()
+    try:
+        with socket.create_connection((BROKER_HOST, server.server_address[1]), timeout=5) as connection:
+            connection.sendall(b'{"secret": "no newline"')
+            # the handler gives up on the request line and closes the connection
+            assert connection.recv(1) == b""
+    finally:
+        server.stop()
+
+
+def test_wrong_secret_is_rejected():
+    server = BrokerServer()
+    server.start()
+    try:
+        with socket.create_connection((BROKER_HOST, server.server_address[1]), timeout=5) as connection:
+            connection.sendall(b'{"secret": "wrong", "method": "search_subtitles"}\n')
+            assert connection.makefile("rb").readline() == b'{"rejected": true}\n'
+    finally:
+        server.stop()
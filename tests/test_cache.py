@@ -0,0 +1,64 @@
+import uuid
+
+import pytest
+
+from resources.lib import cache as cache_module
+from resources.lib.cache import Cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000000.0]
+    monkeypatch.setattr(cache_module, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache():
+    return Cache(key_prefix=f"test-{uuid.uuid4().hex}")
+
+
+def test_value_round_trips(cache):
+    value = {"data": [{"id": 1, "title": "Matrix"}], "total": 1}
+    cache.set("key", value)
+    assert cache.get("key") == value
+    Cache._memory.clear()
+    assert cache.get("key") == value
+
+
+def test_stale_window(cache, clock):
+    cache.set("key", "value", expires=60, stale=300)
+    assert cache.get_with_state("key") == ("value", False)
+
+    clock[0] += 120
+    assert cache.get("key") is None
+    assert cache.get_with_state("key") == ("value", True)
+    assert cache.get_with_state("key", allow_stale=False) == (None, False)
+
+    clock[0] += 300
+    assert cache.get_with_state("key") == (None, False)
+
+
+def test_delete(cache):
+    cache.set("key", "value")
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_lease_is_exclusive_until_released(cache):
+    assert cache.claim("lease", 60)
+    assert not cache.claim("lease", 60)
+    cache.release("lease")
+    assert cache.claim("lease", 60)
+
+
+def test_lease_expires(cache, clock):
+    assert cache.claim("lease", 60)
+    clock[0] += 61
+    assert cache.claim("lease", 60)
+    assert not cache.claim("lease", 60)
+
+
+def test_leases_are_per_prefix(cache):
+    assert cache.claim("lease", 60)
+    assert Cache(key_prefix=f"other-{uuid.uuid4().hex}").claim("lease", 60)
@@ -0,0 +1,182 @@
+import uuid
+
+import pytest
+
+from resources.lib import data_collector
+from resources.lib.data_collector import PLAYER_INFO_LABELS, _call_guessit_api, _guessit_cache, get_media_data, \
+    get_player_context, parse_release_name
+
+# release names and the fields parse_release_name must find in them
+RELEASE_NAMES = [
+    ("The.Matrix.1999.1080p.BluRay.x264-SPARKS.mkv",
+     dict(title="The Matrix", year=1999, type="movie", screen_size="1080p", source="Blu-ray", release_group="SPARKS")),
+    ("Inception (2010) [720p] [YTS.MX].mp4", dict(title="Inception", year=2010, type="movie", screen_size="720p")),
+    ("2001.A.Space.Odyssey.1968.REMASTERED.2160p.UHD.BluRay.x265-TERMiNAL.mkv",
+     dict(title="2001 A Space Odyssey", year=1968)),
+    ("Breaking.Bad.S05E14.Ozymandias.720p.WEB-DL.DD5.1.H.264-BS.mkv",
+     dict(title="Breaking Bad", season=5, episode=14, type="episode", source="Web", release_group="BS")),
+    ("game.of.thrones.s01e01.hdtv.xvid-fqm.avi",
+     dict(title="game of thrones", season=1, episode=1, source="HDTV", release_group="fqm")),
+    ("Doctor.Who.2005.S00E05.Christmas.Special.720p.HDTV.x264.mkv", dict(title="Doctor Who", season=0, episode=5,
+                                                                          year=2005)),
+    ("Friends.S02E12E13.DVDRip.XviD-SAiNTS.avi", dict(title="Friends", season=2, episodes=[12, 13])),
+    ("The.Office.US.S03E01-E02.1080p.mkv", dict(title="The Office US", season=3, episodes=[1, 2])),
+    ("Seinfeld.3x05.The.Pen.DVDRip.avi", dict(title="Seinfeld", season=3, episode=5)),
+    ("Blade Runner 2049 (2017) 2160p.mkv", dict(title="Blade Runner 2049", year=2017)),
+    ("Amelie.2001.FRENCH.1080p.BluRay.x264-LOST.mkv", dict(title="Amelie", year=2001)),
+    ("Dune.Part.Two.2024.1080p.WEBRip.x264-RARBG.mp4", dict(title="Dune Part Two", year=2024, source="Web")),
+    ("Se7en.1995.REMASTERED.720p.BluRay.x264.mkv", dict(title="Se7en", year=1995)),
+    ("The.Mandalorian.S02E08.Chapter.16.2160p.WEB-DL.mkv", dict(title="The Mandalorian", season=2, episode=8)),
+    ("Sherlock.S04E03.720p.HDTV.x264-MTB.mkv", dict(title="Sherlock", season=4, episode=3, release_group="MTB")),
+    ("1917.2019.1080p.BluRay.mkv", dict(title="1917", year=2019)),
+    ("Alien.1979.Directors.Cut.BDRip.mkv", dict(title="Alien", year=1979, source="Blu-ray")),
+    ("movie.mkv", dict(title="movie")),
+    # codec and bit depth tokens after the episode are no episodes
+    ("Show.Name.S01E05.10bit.mkv", dict(title="Show Name", season=1, episodes=[5])),
+    ("Show.Name.S01E05-10bit.x265.mkv", dict(title="Show Name", season=1, episodes=[5])),
+    ("Show.Name.S01E05.1080p.mkv", dict(title="Show Name", season=1, episodes=[5], screen_size="1080p")),
+    ("Show.Name.S01E05.264.mkv", dict(title="Show Name", season=1, episodes=[5])),
+    ("Show.Name.S01E05-07.720p.mkv", dict(title="Show Name", season=1, episodes=[5, 6, 7])),
+    ("Show.Name.S01E05.E06.mkv", dict(title="Show Name", season=1, episodes=[5, 6])),
+    # release markers before the year or episode are title words
+    ("The.Proper.Way.2019.1080p.mkv", dict(title="The Proper Way", year=2019, screen_size="1080p")),
+    ("Cam.2018.1080p.WEB-DL.x264-NTb.mkv", dict(title="Cam", year=2018, source="Web", release_group="NTb")),
+    ("Dual.2022.1080p.BluRay.x264.mkv", dict(title="Dual", year=2022, source="Blu-ray")),
+    ("Extended.Family.S01E02.HDTV.mkv", dict(title="Extended Family", season=1, episode=2, source="HDTV")),
+    # neither episode numbers nor the end of a source are release groups
+    ("Show.Name.S01E05-06.mkv", dict(title="Show Name", episodes=[5, 6], release_group=None)),
+    ("Show.Name.S01E05.1080p.WEB-DL.mkv", dict(title="Show Name", source="Web", release_group=None)),
+    ("Heat.1995.BluRay-Ray.mkv", dict(title="Heat", release_group="Ray")),
+]
+
+
+@pytest.fixture
+def guessit(monkeypatch):
+    requests = []
+    monkeypatch.setattr(data_collector, "sleep", lambda seconds: None)
+    monkeypatch.setattr(data_collector, "_request_guessit",
+                        lambda filename: requests.append(filename) or {"title": "Movie"})
+    return requests
+
+
+def test_guessit_answer_is_cached(guessit):
+    filename = f"{uuid.uuid4().hex}.mkv"
+    assert _call_guessit_api(filename) == {"title": "Movie"}
+    assert _call_guessit_api(filename) == {"title": "Movie"}
+    assert guessit == [filename]
+    assert _guessit_cache.claim(f"request:{filename}", 1)
+
+
+def test_guessit_waits_for_request_in_flight_elsewhere(guessit):
+    filename = f"{uuid.uuid4().hex}.mkv"
+    # another Kodi process holds the request lease and never answers
+    assert _guessit_cache.claim(f"request:{filename}", 600)
+    assert _call_guessit_api(filename) is None
+    assert guessit == []
+    assert not _guessit_cache.claim(f"request:{filename}", 1)
+
+
+@pytest.mark.parametrize("filename, expected", RELEASE_NAMES)
+def test_parse_release_name(filename, expected):
+    result = parse_release_name(filename)
+    assert {key: result.get(key) for key in expected} == expected
+
+
+def test_parse_release_name_accuracy():
+    results = [(parse_release_name(filename), expected) for filename, expected in RELEASE_NAMES]
+    fields = sum(len(expected) for _, expected in results)
+    correct = sum(result.get(key) == value for result, expected in results for key, value in expected.items())
+    assert correct == fields, f"{correct}/{fields} fields parsed correctly"
+
+
+def test_parse_release_name_confidence():
+    assert parse_release_name("The.Matrix.1999.1080p.BluRay.x264-SPARKS.mkv")["confidence"] >= \
+        data_collector.RELEASE_CONFIDENCE_THRESHOLD
+    assert parse_release_name("The.Proper.Way.2019.1080p.mkv")["confidence"] >= \
+        data_collector.RELEASE_CONFIDENCE_THRESHOLD
+    assert parse_release_name("movie.mkv")["confidence"] < data_collector.RELEASE_CONFIDENCE_THRESHOLD
+    # the title may end early at a marker that is a title word, guessit knows better
+    assert parse_release_name("Up.1080p.BluRay.mkv")["confidence"] < data_collector.RELEASE_CONFIDENCE_THRESHOLD
+
+
+@pytest.fixture
+def player(monkeypatch):
+    state = {"labels": {"VideoPlayer.Title": "Heat", "VideoPlayer.Year": "1995"}, "requests": []}
+
+    def jsonrpc(method, params=None, use_cache=True):
+        state["requests"].append(method)
+        return state["labels"]
+
+    monkeypatch.setattr(data_collector, "_jsonrpc", jsonrpc)
+    monkeypatch.setattr(data_collector, "get_file_path", lambda: "/movies/Heat.mkv")
+    monkeypatch.setattr(data_collector.xbmc, "getInfoLabel", lambda label: "fallback " + label, raising=False)
+    return state
+
+
+def test_player_context_is_one_read_only_snapshot(player):
+    context = get_player_context()
+    assert player["requests"] == ["XBMC.GetInfoLabels"]
+    assert set(context) == set(PLAYER_INFO_LABELS) | {"file"}
+    assert (context["VideoPlayer.Title"], context["VideoPlayer.Year"], context["file"]) == \
+        ("Heat", "1995", "/movies/Heat.mkv")
+    assert context["VideoPlayer.Season"] == ""
+    with pytest.raises(TypeError):
+        context["VideoPlayer.Title"] = "Ronin"
+
+
+def test_player_context_falls_back_to_single_labels(player):
+    player["labels"] = None
+    context = get_player_context()
+    assert context["VideoPlayer.Title"] == "fallback VideoPlayer.Title"
+    assert get_media_data(context)["original_title"] == "fallback VideoPlayer.OriginalTitle"
+
+
+def test_show_ids_are_cached_until_shows_change(monkeypatch):
+    requests = []
+    episodeguide = '<episodeguide>{"tmdb": "1396"}</episodeguide>'
+
+    def jsonrpc(method, params=None, use_cache=True):
+        requests.append(params["tvshowid"])
+        return {"tvshowdetails": {"imdbnumber": "tt0903747", "uniqueid": {}, "episodeguide": episodeguide}}
+
+    monkeypatch.setattr(data_collector, "_jsonrpc", jsonrpc)
+    tvshowid = uuid.uuid4().int % 1000000
+    assert data_collector._get_show_ids_from_library(tvshowid) == (903747, 1396)
+    assert data_collector._get_show_ids_from_library(str(tvshowid)) == (903747, 1396)
+    assert requests == [tvshowid]
+
+    data_collector.invalidate_show_ids()
+    assert data_collector._get_show_ids_from_library(tvshowid) == (903747, 1396)
+    assert requests == [tvshowid, tvshowid]
+
+
+def test_item_context_of_a_playlist_episode():
+    context = data_collector.get_item_context({
+        "type": "episode", "id": 7, "title": "Ozymandias", "showtitle": "Breaking Bad", "season": 5, "episode": 14,
+        "tvshowid": 3, "year": 2013, "uniqueid": {"tmdb": "62161"}, "file": "/tv/Breaking.Bad.S05E14.mkv"})
+    assert set(context) == set(PLAYER_INFO_LABELS) | {"file"}
+    assert (context["VideoPlayer.TVshowtitle"], context["VideoPlayer.Season"], context["VideoPlayer.Episode"],
+            context["VideoPlayer.TvShowDBID"], context["VideoPlayer.UniqueID(tmdb)"]) == \
+        ("Breaking Bad", "5", "14", "3", "62161")
+    # episodes have no movie title or database ID
+    assert (context["VideoPlayer.OriginalTitle"], context["VideoPlayer.DBID"]) == ("", "")
+    assert context["file"] == "/tv/Breaking.Bad.S05E14.mkv"
+
+
+def test_item_context_of_a_playlist_movie():
+    context = data_collector.get_item_context({
+        "type": "movie", "id": 12, "title": "Heat", "originaltitle": "", "year": 1995, "season": -1,
+        "episode": -1, "tvshowid": -1, "imdbnumber": "tt0113277", "file": "/movies/Heat.mkv"})
+    assert (context["VideoPlayer.OriginalTitle"], context["VideoPlayer.Year"], context["VideoPlayer.DBID"],
+            context["VideoPlayer.IMDBNumber"]) == ("Heat", "1995", "12", "tt0113277")
+    assert (context["VideoPlayer.Season"], context["VideoPlayer.Episode"], context["VideoPlayer.TvShowDBID"]) == \
+        ("", "", "")
+    with pytest.raises(TypeError):
+        context["file"] = "/movies/Ronin.mkv"
+
+
+def test_item_context_of_a_file_outside_the_library():
+    context = data_collector.get_item_context({"type": "unknown", "label": "Heat.1995.mkv",
+                                               "file": "/downloads/Heat.1995.mkv"})
+    assert context["VideoPlayer.Title"] == "Heat.1995.mkv"
+    assert not any(value for label, value in context.items() if label not in ("VideoPlayer.Title", "file"))
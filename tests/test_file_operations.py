@@ -0,0 +1,176 @@
+import os
+import random
+import re
+import struct
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import xbmcvfs
+
+from resources.lib.file_operations import HASH_CHUNK_SIZE, LONG_LONG_SIZE, cached_hash_file, hash_file, hash_http, \
+    hash_rar, read_head_tail_parallel, stat_file, sum_longs
+from resources.lib.hash_cache import get_hash_cache
+from tests.rar_fixtures import build_rar4_volumes, build_rar5_volumes
+
+
+def sum_longs_per_word(buffer, hash_=0):
+    """The per-word loop sum_longs replaced."""
+    for x in range(len(buffer) // LONG_LONG_SIZE):
+        size = x * LONG_LONG_SIZE
+        (l_value,) = struct.unpack("q", buffer[size:size + LONG_LONG_SIZE])
+        hash_ += l_value
+        hash_ = hash_ & 0xFFFFFFFFFFFFFFFF
+    return hash_
+
+
+def test_sum_longs_matches_per_word_loop():
+    rng = random.Random(0)
+    for size in (0, 7, 8, 9, 1000, 65536, 131072):
+        buffer = bytes(rng.getrandbits(8) for _ in range(size))
+        start = rng.getrandbits(64)
+        assert sum_longs(buffer, start) == sum_longs_per_word(buffer, start)
+        assert sum_longs(bytearray(buffer), start) == sum_longs_per_word(buffer, start)
+
+
+def test_sum_longs_wraps_around():
+    buffer = b"\xff" * 16
+    assert sum_longs(buffer, 0xFFFFFFFFFFFFFFFF) == sum_longs_per_word(buffer, 0xFFFFFFFFFFFFFFFF)
+
+
+def test_sum_longs_unaligned_memoryview():
+    buffer = os.urandom(LONG_LONG_SIZE * 100 + 3)
+    view = memoryview(buffer)[3:]
+    assert sum_longs(view, 42) == sum_longs_per_word(bytes(view), 42)
+
+
+def test_short_read_is_not_hashed_or_cached(tmp_path, monkeypatch):
+    video = tmp_path / "movie.mkv"
+    video.write_bytes(os.urandom(HASH_CHUNK_SIZE * 3))
+    read_bytes = xbmcvfs.File.readBytes
+    monkeypatch.setattr(xbmcvfs.File, "readBytes", lambda f, count=-1: read_bytes(f, count)[:count // 2])
+
+    for hash_ in (lambda: cached_hash_file(str(video), False), lambda: read_head_tail_parallel(str(video))):
+        with pytest.raises(Exception, match="Short read"):
+            hash_()
+    size, mtime = stat_file(str(video))
+    assert get_hash_cache().get(str(video), size, mtime) is None
+
+    monkeypatch.undo()
+    assert cached_hash_file(str(video), False) == get_hash_cache().get(str(video), size, mtime)
+
+
+def write_volumes(tmp_path, volumes, names):
+    for volume, name in zip(volumes, names):
+        (tmp_path / name).write_bytes(volume)
+    return str(tmp_path / names[0])
+
+
+def plain_hash(tmp_path, content):
+    video = tmp_path / "movie.mkv"
+    video.write_bytes(content)
+    return hash_file(str(video), False)
+
+
+@pytest.mark.parametrize("size, volume_size, volumes", [
+    (HASH_CHUNK_SIZE * 3, HASH_CHUNK_SIZE * 4, 1),
+    (HASH_CHUNK_SIZE * 3 + 100, HASH_CHUNK_SIZE * 2, 2),
+    (HASH_CHUNK_SIZE * 11 + 12345, HASH_CHUNK_SIZE * 3, 4),
+])
+def test_hash_rar5_matches_plain_file(tmp_path, size, volume_size, volumes):
+    content = os.urandom(size)
+    rar_volumes = build_rar5_volumes(content, volume_size)
+    assert len(rar_volumes) == volumes
+    first = write_volumes(tmp_path, rar_volumes, [f"movie.part{i + 1}.rar" for i in range(volumes)])
+    assert hash_rar(first) == plain_hash(tmp_path, content)
+
+
+@pytest.mark.parametrize("size, volume_size, volumes", [
+    (HASH_CHUNK_SIZE * 3, HASH_CHUNK_SIZE * 4, 1),
+    (HASH_CHUNK_SIZE * 11 + 12345, HASH_CHUNK_SIZE * 3, 4),
+])
+def test_hash_rar4_matches_plain_file(tmp_path, size, volume_size, volumes):
+    content = os.urandom(size)
+    rar_volumes = build_rar4_volumes(content, volume_size)
+    assert len(rar_volumes) == volumes
+    names = ["movie.rar"] + [f"movie.r{i:02d}" for i in range(volumes - 1)]
+    first = write_volumes(tmp_path, rar_volumes, names)
+    assert hash_rar(first) == plain_hash(tmp_path, content)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    """Serves the server's content and honours single byte ranges."""
+    accept_ranges = "bytes"
+    honour_ranges = True
+
+    def do_HEAD(self):
+        self.send_headers(200, len(self.server.content))
+
+    def do_GET(self):
+        self.server.gets.append(self.headers.get("Range"))
+        content = self.server.content
+        match = re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers.get("Range") or "")
+        if match and self.honour_ranges:
+            start, end = int(match.group(1)), int(match.group(2))
+            content = content[start:end + 1]
+            self.send_headers(206, len(content))
+        else:
+            self.send_headers(200, len(content))
+        self.wfile.write(content)
+
+    def send_headers(self, status, length):
+        self.send_response(status)
+        self.send_header("Content-Length", str(length))
+        if self.accept_ranges:
+            self.send_header("Accept-Ranges", self.accept_ranges)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class IgnoreRangeHandler(RangeHandler):
+    accept_ranges = None
+    honour_ranges = False
+
+
+class NoRangeHandler(RangeHandler):
+    accept_ranges = "none"
+
+
+@pytest.fixture
+def http_server():
+    servers = []
+
+    def serve(handler, content):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.content = content
+        server.gets = []
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/movie.mkv"
+
+    yield serve
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_hash_http_matches_hash_file(tmp_path, http_server):
+    content = os.urandom(HASH_CHUNK_SIZE * 5 + 123)
+    server, url = http_server(RangeHandler, content)
+    assert hash_http(f"{url}|User-Agent=Kodi") == plain_hash(tmp_path, content)
+    assert len(server.gets) == 2
+
+
+def test_hash_http_without_range_support(http_server):
+    content = os.urandom(HASH_CHUNK_SIZE * 3)
+    _, url = http_server(IgnoreRangeHandler, content)
+    assert hash_http(url) is None
+
+
+def test_hash_http_with_ranges_refused(http_server):
+    server, url = http_server(NoRangeHandler, os.urandom(HASH_CHUNK_SIZE * 3))
+    assert hash_http(url) is None
+    assert server.gets == []
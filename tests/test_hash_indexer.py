@@ -0,0 +1,72 @@
+import pytest
+
+from resources.lib import hash_indexer
+from resources.lib.file_operations import HASH_CHUNK_SIZE
+from resources.lib.hash_indexer import LibraryHashIndexer, RateLimiter
+
+
+class FakeClock(object):
+    """Monitor whose waits advance the time RateLimiter sees instead of sleeping."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.waits = []
+
+    def time(self):
+        return self.now
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout):
+        self.waits.append(timeout)
+        if len(self.waits) > 100:
+            pytest.fail("RateLimiter.acquire never returned")
+        self.now += timeout
+        return False
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(hash_indexer, "time", clock.time)
+    return clock
+
+
+def test_acquire_larger_than_rate(clock):
+    rate_limiter = RateLimiter(clock, 64 * 1024)
+    for _ in range(3):
+        assert rate_limiter.acquire(HASH_CHUNK_SIZE * 2)
+    # 128 KiB at 64 KiB/s, after the first read the bucket refills for 2s per read
+    assert clock.now == pytest.approx(5)
+
+
+def test_acquire_within_rate(clock):
+    rate_limiter = RateLimiter(clock, 1024 * 1024)
+    assert rate_limiter.acquire(HASH_CHUNK_SIZE * 2)
+    assert clock.waits == []
+
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_acquire_without_rate(clock, rate):
+    assert RateLimiter(clock, rate).acquire(HASH_CHUNK_SIZE * 2)
+    assert clock.waits == []
+
+
+def test_set_rate_applies_to_next_acquire(clock):
+    rate_limiter = RateLimiter(clock, 64 * 1024)
+    assert rate_limiter.acquire(64 * 1024)
+    rate_limiter.set_rate(1024 * 1024)
+    assert rate_limiter.acquire(HASH_CHUNK_SIZE * 2)
+    assert clock.now == pytest.approx(0.125)
+    rate_limiter.set_rate(0)
+    assert rate_limiter.acquire(HASH_CHUNK_SIZE * 2)
+    assert clock.now == pytest.approx(0.125)
+
+
+def test_disabled_indexer_hashes_nothing(clock):
+    indexer = LibraryHashIndexer(clock, None, 1024 * 1024)
+    indexer.configure(False, 1024 * 1024)
+    indexer.start()
+    assert indexer._thread is None
+    assert not indexer.index_file(None, "/movies/movie.mkv")
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+
+from resources.lib import data_collector, library_index as library_index_module
+from resources.lib.library_index import LibraryIndex
+
+MOVIES = [
+    {"movieid": 1, "title": "The Matrix", "originaltitle": "The Matrix", "year": 1999},
+    {"movieid": 2, "title": "The Matrix Reloaded", "originaltitle": "", "year": 2003},
+    {"movieid": 3, "title": "Amélie", "originaltitle": "Le Fabuleux Destin d'Amélie Poulain", "year": 2001},
+    {"movieid": 4, "title": "The Thing", "originaltitle": "", "year": 1982},
+]
+SHOWS = [{"tvshowid": 1, "title": "The Office", "originaltitle": "", "year": 2005}]
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    requests = []
+
+    def jsonrpc(method, params=None, use_cache=True):
+        requests.append((method, params))
+        if method == "VideoLibrary.GetMovies":
+            movies = MOVIES
+            if "filter" in params:
+                movies = [movie for movie in MOVIES if params["filter"]["value"].lower() in movie["title"].lower()]
+            return {"movies": movies, "limits": {"total": len(movies)}}
+        if method == "VideoLibrary.GetTVShows":
+            return {"tvshows": SHOWS, "limits": {"total": len(SHOWS)}}
+        if method == "VideoLibrary.GetMovieDetails":
+            return {"moviedetails": {"movieid": params["movieid"], "title": "Heat", "originaltitle": "", "year": 1995}}
+        return None
+
+    monkeypatch.setattr(library_index_module, "_jsonrpc", jsonrpc)
+    monkeypatch.setattr(library_index_module, "open_database",
+                        lambda name: sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False))
+    return requests
+
+
+@pytest.fixture
+def index(requests):
+    index = LibraryIndex()
+    index.rebuild()
+    return index
+
+
+def titles(items):
+    return sorted(item["title"] for item in items)
+
+
+def test_find_prefers_exact_normalized_title(index):
+    assert titles(index.find("movie", "the.matrix")) == ["The Matrix"]
+    assert titles(index.find("movie", "Amelie")) == ["Amélie"]
+    assert titles(index.find("movie", "le fabuleux destin d amelie poulain")) == ["Amélie"]
+    assert titles(index.find("tvshow", "The Office")) == ["The Office"]
+
+
+def test_find_matches_contained_titles(index):
+    assert titles(index.find("movie", "Matrix")) == ["The Matrix", "The Matrix Reloaded"]
+    assert titles(index.find("movie", "The Matrix Reloaded Extended")) == ["The Matrix", "The Matrix Reloaded"]
+    assert index.find("movie", "Matrix Revolutions") == []
+    # stopwords don't pull in every "the" title
+    assert index.find("movie", "The Revolutions") == []
+    assert index.find("movie", "Office") == []
+    assert index.find("movie", "...") == []
+
+
+def test_update_and_remove(index):
+    index.update("movie", 4)
+    assert index.find("movie", "The Thing") == []
+    assert titles(index.find("movie", "Heat")) == ["Heat"]
+    index.remove("movie", 1)
+    assert titles(index.find("movie", "Matrix")) == ["The Matrix Reloaded"]
+
+
+def test_outdated_index_is_used_without_rebuilding(index, requests, monkeypatch):
+    monkeypatch.setattr(library_index_module, "_library_index", index)
+    index._db.execute("UPDATE meta SET value=0 WHERE key='built'")
+    assert index.is_built() and not index.is_current()
+    del requests[:]
+    assert titles(data_collector._find_in_library("movie", "The Matrix")) == ["The Matrix"]
+    assert requests == []
+
+
+def test_missing_index_falls_back_to_bounded_lookup(requests, monkeypatch):
+    monkeypatch.setattr(library_index_module, "_library_index", LibraryIndex())
+    assert titles(data_collector._find_in_library("movie", "Matrix")) == ["The Matrix", "The Matrix Reloaded"]
+    (method, params), = requests
+    assert method == "VideoLibrary.GetMovies"
+    assert params["limits"] == {"end": library_index_module.LOOKUP_LIMIT}
+    assert not library_index_module.get_library_index().is_built()
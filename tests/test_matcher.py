@@ -0,0 +1,69 @@
+from difflib import SequenceMatcher
+
+import pytest
+
+from resources.lib.data_collector import clean_feature_release_name
+from resources.lib.matcher import is_same_title, normalize_title, prepare, similarity
+from tests.title_fixtures import build_queries, build_release_names, build_titles
+
+
+def ratio(a, b):
+    """The difflib score the trigram matcher replaced."""
+    return SequenceMatcher(None, a.lower(), b.lower()).ratio()
+
+
+def test_normalize_title():
+    assert normalize_title("Amélie") == "amelie"
+    assert normalize_title("WALL·E_(2008)") == "wall e 2008"
+    assert normalize_title(None) == ""
+    assert is_same_title("Léon: The Professional", "leon the professional")
+
+
+def test_similarity():
+    assert similarity("The Matrix", "the.matrix") == 1.0
+    assert similarity("", "") == 0.0
+    assert similarity("The Matrix", "Heat") == 0.0
+    assert similarity("The Matrix", "The Matrix Reloaded") > similarity("The Matrix", "The Matrix Revolutions Part 2")
+    assert similarity(prepare("Heat"), "Heat 1995") == similarity("Heat", "Heat 1995")
+
+
+def test_ranking_finds_misspelled_titles_like_sequence_matcher():
+    titles = build_titles(500)
+    queries = build_queries(titles, 60)
+    found = found_by_ratio = 0
+    for query, title in queries:
+        search = prepare(query)
+        found += max(titles, key=lambda candidate: similarity(search, candidate)) == title
+        found_by_ratio += max(titles, key=lambda candidate: ratio(query, candidate)) == title
+    assert found >= found_by_ratio
+
+
+@pytest.mark.parametrize("title, release", [
+    ("Alien", "Alien.Directors.Cut.1979.BluRay"),
+    ("Amélie", "amelie.2001.1080p.bluray.x264-lost"),
+    ("Toy Story 3", "Toy_Story_3_2010_720p_HDTV_XviD"),
+    ("Heat", "Heat"),
+])
+def test_release_naming_the_title_is_kept(title, release):
+    assert clean_feature_release_name(title, release) == release
+
+
+@pytest.mark.parametrize("title, release", [
+    ("Her", "Heat.1995.1080p.BluRay.x264"),
+    ("Heat", "1080p.BluRay.x264-SPARKS"),
+])
+def test_release_without_the_title_gets_it(title, release):
+    assert clean_feature_release_name(title, release) == f"{title} {release}"
+
+
+def test_release_names_decide_like_sequence_matcher():
+    releases = build_release_names()
+    kept = [clean_feature_release_name(title, release) == release for title, release, _ in releases]
+    kept_by_ratio = [title in release or ratio(title, release) > 0.3 for title, release, _ in releases]
+    # away from the releases naming the title, where the length of the rest flips difflib's ratio
+    agreeing = [keep == keep_by_ratio for keep, keep_by_ratio, (title, release, _) in zip(kept, kept_by_ratio, releases)
+                if f" {normalize_title(title)} " not in f" {normalize_title(release)} "]
+    assert sum(agreeing) >= 0.95 * len(agreeing)
+    correct = sum(keep == names for keep, (_, _, names) in zip(kept, releases))
+    correct_by_ratio = sum(keep == names for keep, (_, _, names) in zip(kept_by_ratio, releases))
+    assert correct >= correct_by_ratio
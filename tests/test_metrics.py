@@ -0,0 +1,33 @@
+import uuid
+
+import pytest
+
+from resources.lib import metrics
+
+
+@pytest.fixture
+def prefix():
+    return f"test.{uuid.uuid4().hex}."
+
+
+def test_counters_add_up_across_flushes(prefix):
+    metrics.increment(f"{prefix}hits")
+    metrics.flush()
+    metrics.increment(f"{prefix}hits", 2)
+    assert metrics.get_counters(prefix) == {f"{prefix}hits": 3}
+
+
+def test_observe_records_count_total_and_max(prefix):
+    metrics.observe(f"{prefix}get", 0.002)
+    metrics.observe(f"{prefix}get", 0.004)
+    metrics.flush()
+    metrics.observe(f"{prefix}get", 0.001)
+    assert metrics.get_counters(prefix) == {f"{prefix}get.count": 3, f"{prefix}get.max_ms": 4,
+                                            f"{prefix}get.total_ms": 7}
+
+
+def test_gauges_keep_the_last_value(prefix):
+    metrics.set_gauge(f"{prefix}entries", 10)
+    metrics.flush()
+    metrics.set_gauge(f"{prefix}entries", 4)
+    assert metrics.get_counters(prefix) == {f"{prefix}entries": 4}
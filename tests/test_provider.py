@@ -0,0 +1,26 @@
+from resources.lib.os.provider import FEATURE_DETAILS, FILE_ATTRIBUTES, SUBTITLE_ATTRIBUTES, project_subtitles
+from tests.search_fixtures import build_search_response
+
+
+def test_project_subtitles_keeps_listing_and_download_fields():
+    data = build_search_response("The Matrix", 1999, 133093, count=20)
+    projected = project_subtitles(data)
+    assert len(projected) == len(data)
+    for subtitle, row in zip(projected, data):
+        attributes = row["attributes"]
+        assert subtitle["id"] == row["id"]
+        assert set(subtitle["attributes"]) == set(SUBTITLE_ATTRIBUTES) | {"feature_details", "files"}
+        for key in SUBTITLE_ATTRIBUTES:
+            assert subtitle["attributes"][key] == attributes[key]
+        assert subtitle["attributes"]["feature_details"] == \
+            {key: attributes["feature_details"][key] for key in FEATURE_DETAILS}
+        assert subtitle["attributes"]["files"] == \
+            [{key: file[key] for key in FILE_ATTRIBUTES} for file in attributes["files"]]
+
+
+def test_project_subtitles_with_missing_fields():
+    assert project_subtitles([{"id": "1", "attributes": {"language": "en", "feature_details": None}}]) == [{
+        "id": "1",
+        "attributes": {**{key: None for key in SUBTITLE_ATTRIBUTES}, "language": "en",
+                       "feature_details": {key: None for key in FEATURE_DETAILS}, "files": []},
+    }]
@@ -0,0 +1,83 @@
+import sys
+import threading
+
+import pytest
+
+from resources.lib import subtitle_downloader as subtitle_downloader_module
+from resources.lib.file_operations import get_stack_parts
+from resources.lib.subtitle_downloader import SubtitleDownloader, build_query, get_cache_stats
+
+
+def downloader(**query):
+    subtitle_downloader = SubtitleDownloader.__new__(SubtitleDownloader)
+    subtitle_downloader.query = query
+    return subtitle_downloader
+
+
+def test_get_stack_parts():
+    assert get_stack_parts("stack:///movies/Movie,, The cd1.avi , /movies/Movie,, The cd2.avi") == \
+        ["/movies/Movie, The cd1.avi", "/movies/Movie, The cd2.avi"]
+
+
+def test_get_file_ids_of_stack_split_like_the_subtitle():
+    files = [{"file_id": 12, "cd_number": 2}, {"file_id": 11, "cd_number": 1}]
+    assert downloader(stack_size=2).get_file_ids(files) == "11,12"
+
+
+def test_get_file_ids_of_stack_split_differently():
+    files = [{"file_id": 11, "cd_number": 1}, {"file_id": 12, "cd_number": 2}]
+    assert downloader(stack_size=3).get_file_ids(files) == "11"
+
+
+def test_get_file_ids_without_stack():
+    assert downloader().get_file_ids([{"file_id": 11, "cd_number": 1}, {"file_id": 12, "cd_number": 2}]) == "11"
+
+
+def test_cache_stats_without_provider(monkeypatch):
+    # importing the provider would fail
+    monkeypatch.setitem(sys.modules, "resources.lib.os.provider", None)
+    stats = get_cache_stats()
+    for gauge in ("cache.search.entries", "cache.token.bytes", "cache.subtitles.entries", "cache.hash.entries"):
+        assert gauge in stats
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    def install(concurrent):
+        calls = []
+        # each stage waits for the other ones, so they only finish when they run at the same time
+        barrier = threading.Barrier(concurrent, timeout=5)
+
+        def stage(name, result):
+            def run(arg):
+                calls.append((name, arg))
+                barrier.wait()
+                return dict(result)
+            return run
+
+        monkeypatch.setattr(subtitle_downloader_module, "get_file_data",
+                            stage("file_data", {"basename": "Heat.1995.mkv", "moviehash": "8e245d9679d31e12"}))
+        monkeypatch.setattr(subtitle_downloader_module, "get_language_data",
+                            stage("language_data", {"languages": "en"}))
+        monkeypatch.setattr(subtitle_downloader_module, "get_media_data",
+                            stage("media_data", {"query": None, "imdb_id": 113277}))
+        return calls
+
+    return install
+
+
+def test_build_query_collects_stages_concurrently(stages):
+    calls = stages(3)
+    context = {"file": "/movies/Heat.1995.mkv"}
+    assert build_query({"languages": "English"}, context=context) == {
+        "query": "Heat.1995.mkv", "imdb_id": 113277, "basename": "Heat.1995.mkv", "moviehash": "8e245d9679d31e12",
+        "languages": "en"}
+    assert sorted(calls) == [("file_data", "/movies/Heat.1995.mkv"), ("language_data", {"languages": "English"}),
+                             ("media_data", context)]
+
+
+def test_build_query_with_query_skips_media_data(stages):
+    calls = stages(2)
+    assert build_query({}, query="Heat", context={"file": "/movies/Heat.1995.mkv"}) == {
+        "query": "Heat", "basename": "Heat.1995.mkv", "moviehash": "8e245d9679d31e12", "languages": "en"}
+    assert "media_data" not in dict(calls)
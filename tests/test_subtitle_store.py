@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from resources.lib.subtitle_store import SubtitleStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SubtitleStore(byte_budget=250)
+    store.path = str(tmp_path / "subtitles")
+    return store
+
+
+def age(store, file_id, mtime):
+    path = store._get_path(file_id, "srt")
+    os.utime(path, (mtime, mtime))
+
+
+def test_get_returns_stored_content(store):
+    assert store.get(1, "srt") is None
+    store.set(1, "srt", b"1\n00:00:01,000 --> 00:00:02,000\nHello\n")
+    assert store.get(1, "srt") == b"1\n00:00:01,000 --> 00:00:02,000\nHello\n"
+    assert store.get(1, "ass") is None
+
+
+def test_least_recently_used_are_evicted_over_budget(store):
+    for file_id in (1, 2, 3):
+        store.set(file_id, "srt", b"x" * 80)
+        age(store, file_id, 1000 + file_id)
+    assert store.get(1, "srt") is not None
+    # over budget now, 1 was just used so 2 goes first
+    store.set(4, "srt", b"x" * 50)
+    assert store.stats() == {"entries": 3, "bytes": 210}
+    assert store.get(2, "srt") is None
+
+    store.set(5, "srt", b"x" * 80)
+    assert [store.get(file_id, "srt") is not None for file_id in (1, 3, 4, 5)] == [True, False, True, True]
+
+
+def test_file_ids_stay_in_the_store(store):
+    store.set("../../escape", "srt", b"content")
+    assert os.listdir(store.path) == ["______escape.srt"]
+    assert store.get("../../escape", "srt") == b"content"
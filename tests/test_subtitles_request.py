@@ -0,0 +1,24 @@
+from resources.lib.os.model.request.subtitles import canonicalize_params
+
+
+def test_equivalent_searches_are_equal():
+    assert canonicalize_params({"languages": "EN,fr, en", "query": "  The   Matrix ", "year": "1999"}) == \
+        canonicalize_params({"languages": ["fr", "en"], "query": "the matrix", "year": 1999})
+
+
+def test_languages_are_sorted_and_deduplicated():
+    assert canonicalize_params({"languages": "pt-BR,en,,EN"}) == {"languages": "en,pt-br"}
+
+
+def test_query_is_dropped_next_to_an_id():
+    assert canonicalize_params({"query": "The Matrix", "imdb_id": "133093"}) == {"imdb_id": 133093}
+    assert canonicalize_params({"query": "The Matrix", "imdb_id": ""}) == {"query": "the matrix"}
+
+
+def test_empty_values_are_dropped_but_zero_is_kept():
+    assert canonicalize_params({"query": " ", "moviehash": "", "season_number": "0", "type": "Episode"}) == \
+        {"season_number": 0, "type": "episode"}
+
+
+def test_moviehash_is_lowercased():
+    assert canonicalize_params({"moviehash": "8E245D9679D31E12"}) == {"moviehash": "8e245d9679d31e12"}
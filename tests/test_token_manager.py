@@ -0,0 +1,58 @@
+import uuid
+
+import pytest
+
+from resources.lib.cache import Cache
+from resources.lib.exceptions import ProviderError
+from resources.lib.os import token_manager
+from resources.lib.os.token_manager import LOGIN_LEASE, LOGIN_LEASE_KEY, TOKEN_KEY, TokenManager
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(token_manager, "time", clock.time)
+    monkeypatch.setattr(token_manager, "sleep", clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def cache():
+    return Cache(key_prefix=f"test-{uuid.uuid4().hex}")
+
+
+def test_login_releases_its_lease(cache):
+    assert TokenManager(cache, lambda: "token").login() == "token"
+    assert cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE)
+
+
+def test_login_waits_for_token_of_login_in_flight(cache, clock, monkeypatch):
+    assert cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE)
+
+    def sleep(seconds):
+        clock.now += seconds
+        cache.set(TOKEN_KEY, "other token")
+
+    monkeypatch.setattr(token_manager, "sleep", sleep)
+    assert TokenManager(cache, lambda: pytest.fail("logged in twice")).login() == "other token"
+
+
+def test_login_timeout_keeps_lease_of_login_in_flight(cache, clock):
+    # held far longer than the wait, the other login is still running
+    assert cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE * 10)
+
+    with pytest.raises(ProviderError):
+        TokenManager(cache, lambda: pytest.fail("logged in twice")).login()
+    assert not cache.claim(LOGIN_LEASE_KEY, LOGIN_LEASE)
@@ -0,0 +1,84 @@
+"""Library titles, misspelled queries and subtitle release names for the title matcher.
+
+Queries are library titles the way filenames and API answers spell them: with a word dropped,
+a letter missing or the words in another order."""
+import random
+
+from tests.search_fixtures import CODECS, RELEASE_GROUPS, SOURCES
+
+WORDS = ["alien", "amelie", "angel", "assault", "black", "blade", "blood", "blue", "city", "country", "dark",
+         "day", "dead", "death", "die", "dream", "dune", "edge", "empire", "escape", "fall", "fire", "fury",
+         "ghost", "god", "gold", "hard", "heart", "heat", "hollywood", "home", "hope", "house", "iron", "island",
+         "king", "knight", "last", "legend", "life", "light", "lost", "love", "mad", "man", "matrix", "men",
+         "moon", "night", "north", "ocean", "old", "planet", "police", "prince", "queen", "rain", "red", "return",
+         "ring", "river", "road", "runner", "secret", "shadow", "silent", "sky", "star", "storm", "story", "street",
+         "sun", "thing", "time", "toy", "twin", "war", "water", "white", "wild", "wind", "winter", "wolf", "world"]
+FEATURES = ["Alien", "Heat", "Up", "Se7en", "The Matrix", "Inception", "Amelie", "Blade Runner 2049",
+            "Dune Part Two", "Mad Max Fury Road", "Spirited Away", "Parasite", "The Godfather Part II",
+            "Once Upon a Time in Hollywood", "Everything Everywhere All at Once", "It", "Her", "Jaws",
+            "No Country for Old Men", "Pulp Fiction", "Star Wars Episode IV A New Hope", "The Dark Knight",
+            "Toy Story 3", "WALL-E", "Léon", "Oldboy", "Amélie", "Die Hard", "Casablanca", "The Italian Job"]
+EDITIONS = ["Directors.Cut", "EXTENDED", "REMASTERED", "UNRATED", "IMAX", "PROPER", ""]
+
+
+def build_titles(count, seed=0):
+    """Returns count distinct library titles of one to five words."""
+    rng = random.Random(seed)
+    titles = set()
+    while len(titles) < count:
+        words = rng.sample(WORDS, rng.randint(1, 5))
+        if rng.random() < 0.3:
+            words.insert(0, "the")
+        if rng.random() < 0.2:
+            words.append(str(rng.randint(2, 4)))
+        titles.add(" ".join(words).title())
+    return sorted(titles)
+
+
+def misspell(title, rng):
+    """Drops a word, drops a letter or swaps two words of title."""
+    words = title.split()
+    change = rng.randrange(3)
+    if change == 0 and len(words) > 1:
+        words.pop(rng.randrange(len(words)))
+    elif change == 1 and len(words) > 1:
+        i = rng.randrange(len(words) - 1)
+        words[i], words[i + 1] = words[i + 1], words[i]
+    else:
+        i = rng.randrange(len(title))
+        return title[:i] + title[i + 1:]
+    return " ".join(words)
+
+
+def build_queries(titles, count, seed=0):
+    """Returns count misspelled titles, each paired with the title it was made from."""
+    rng = random.Random(seed)
+    return [(misspell(title, rng), title) for title in rng.sample(titles, count)]
+
+
+def build_release_names(count_per_feature=30, seed=0):
+    """Returns (feature title, release name, names the feature) triples like clean_feature_release_name gets.
+
+    Releases name the feature, misspell it, leave it out or name another feature."""
+    rng = random.Random(seed)
+    releases = []
+    for title in FEATURES:
+        for _ in range(count_per_feature):
+            tail = ".".join(part for part in (rng.choice(EDITIONS), str(rng.randint(1950, 2024)),
+                                              rng.choice(["720p", "1080p", "2160p", ""]), rng.choice(SOURCES),
+                                              rng.choice(CODECS)) if part) + "-" + rng.choice(RELEASE_GROUPS)
+            kind = rng.randrange(6)
+            if kind == 0:
+                releases.append((title, f"{title}.{tail}".replace(" ", "."), True))
+            elif kind == 1:
+                releases.append((title, f"{title}.{tail}".replace(" ", ".").lower(), True))
+            elif kind == 2:
+                releases.append((title, f"{title}_{tail}".replace(" ", "_").replace(".", "_"), True))
+            elif kind == 3:
+                releases.append((title, f"{misspell(title, rng)}.{tail}".replace(" ", "."), True))
+            elif kind == 4:
+                releases.append((title, tail, False))
+            else:
+                other = rng.choice([feature for feature in FEATURES if feature != title])
+                releases.append((title, f"{other}.{tail}".replace(" ", "."), False))
+    return releases